@@ -1,13 +1,56 @@
-from sys import argv
-from lox.lox import Lox
+from argparse import ArgumentParser
+from sys import argv, stderr
+from lox.lox import Lox, ENGINES
+from lox.profiler import Profiler
 
-def main(args):
-    if len(args) > 2:
-        print('Usage : jlox [script]')
+
+class UsageParser(ArgumentParser):
+    def error(self, message):
+        print('Usage : jlox [-O] [--engine={interpreter,closure,vm,python}] [--max-depth=N] [--profile [--profile-output=FILE]] [--count [--count-output=FILE]] [script]')
         exit(64)
-    elif len(args) == 2:
-        Lox.run_file(args[1])
-    else:
-        Lox.run_prompt()
 
-main(argv)
\ No newline at end of file
+
+def main(args):
+    parser = UsageParser(prog="jlox", add_help=False)
+    parser.add_argument("-O", dest="optimization", action="count", default=0)
+    parser.add_argument("--engine", choices=ENGINES, default="interpreter")
+    parser.add_argument("--max-depth", type=int, default=Lox.max_depth)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-output", default="profile.folded", metavar="FILE")
+    parser.add_argument("--count", action="store_true")
+    parser.add_argument("--count-output", metavar="FILE")
+    parser.add_argument("script", nargs="?")
+    options = parser.parse_args(args[1:])
+
+    # Transpiled programs run as Python code, which cProfile already covers
+    if options.profile and options.engine == "python":
+        parser.error("--profile is not supported by the python engine")
+
+    if options.count and options.engine != "interpreter":
+        parser.error("--count is only supported by the interpreter engine")
+
+    Lox.engine = options.engine
+    Lox.optimization = options.optimization
+    Lox.max_depth = options.max_depth
+
+    if options.profile:
+        Lox.profiler = Profiler()
+
+    Lox.counting = options.count
+
+    try:
+        if options.script:
+            Lox.run_file(options.script)
+        else:
+            Lox.run_prompt()
+    finally:
+        if Lox.profiler:
+            Lox.profiler.report(stderr)
+            Lox.profiler.write_collapsed(options.profile_output)
+
+        if Lox.counting and Lox.interpreter:
+            Lox.interpreter.report(stderr)
+            if options.count_output:
+                Lox.interpreter.write_json(options.count_output)
+
+main(argv)
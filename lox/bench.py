@@ -0,0 +1,157 @@
+"""
+Benchmark runner, usage: python -m lox.bench [-O] [--engine=...] [benchmark ...]
+
+Runs the programs in benchmarks/ through the same phases as Lox.run and
+reports the median and standard deviation of every phase over a number of
+repetitions, after some warmup runs that are not measured. Every benchmark
+runs on every engine in a process of its own, so no engine is measured on a
+heap or caches left behind by another.
+"""
+import io
+import json
+import statistics
+import sys
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+
+from lox.lox import Lox, ENGINES
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+
+PHASES = ("scan", "parse", "optimize", "resolve", "execute")
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def reset(engine: str, optimization: int):
+    """
+    Starts the next run with fresh globals, as if it were a new process
+    """
+    Lox.engine = engine
+    Lox.optimization = optimization
+    Lox.interpreter = None
+    Lox.vm = None
+    Lox.namespace = None
+    Lox.had_error = False
+    Lox.had_runtime_error = False
+
+
+def run_once(source: str, engine: str, optimization: int) -> dict:
+    reset(engine, optimization)
+    times = {}
+
+    with redirect_stdout(io.StringIO()) as output:
+        start = perf_counter()
+        tokens = Lox.scan(source)
+        times["scan"] = perf_counter() - start
+
+        start = perf_counter()
+        statements = Lox.parse(tokens)
+        times["parse"] = perf_counter() - start
+
+        if not Lox.had_error:
+            start = perf_counter()
+            statements = Lox.optimize(statements)
+            times["optimize"] = perf_counter() - start
+
+            start = perf_counter()
+            backend = Lox.resolve(statements)
+            times["resolve"] = perf_counter() - start
+
+        if not Lox.had_error:
+            start = perf_counter()
+            Lox.execute(backend, statements)
+            times["execute"] = perf_counter() - start
+
+    if Lox.had_error or Lox.had_runtime_error:
+        raise BenchmarkError(output.getvalue().strip())
+
+    times["total"] = sum(times.values())
+    return times
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "median": statistics.median(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+    }
+
+
+def measure(path: Path, engine: str, optimization: int, warmup: int, repeat: int) -> dict:
+    source = path.read_text()
+
+    for _ in range(warmup):
+        run_once(source, engine, optimization)
+
+    runs = [run_once(source, engine, optimization) for _ in range(repeat)]
+
+    return {
+        "benchmark": path.stem,
+        "engine": engine,
+        "optimization": optimization,
+        "repeat": repeat,
+        "phases": {phase: summarize([run[phase] for run in runs]) for phase in PHASES + ("total", )},
+    }
+
+
+def measure_isolated(path: Path, engine: str, optimization: int, warmup: int, repeat: int) -> dict:
+    with get_context("spawn").Pool(1) as pool:
+        return pool.apply(measure, (path, engine, optimization, warmup, repeat))
+
+
+def report(result: dict):
+    phases = result["phases"]
+    total = phases["total"]
+    columns = "  ".join(f"{phase} {phases[phase]['median'] * 1000:8.2f}" for phase in PHASES)
+    print(f"{result['benchmark']:16} {result['engine']:12} "
+          f"{total['median']:8.4f}s ± {total['stddev']:.4f}  ms: {columns}")
+
+
+def main(args):
+    parser = ArgumentParser(prog="python -m lox.bench")
+    parser.add_argument("benchmarks", nargs="*", help="benchmark names, all of them by default")
+    parser.add_argument("--engine", choices=ENGINES, action="append",
+                        help="engine to run, may be repeated (default: interpreter)")
+    parser.add_argument("-O", dest="optimization", action="count", default=0, help="optimization level")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON, '-' for stdout")
+    options = parser.parse_args(args[1:])
+
+    names = options.benchmarks or sorted(path.stem for path in BENCHMARKS.glob("*.lox"))
+    engines = options.engine or ["interpreter"]
+
+    results = []
+    for name in names:
+        path = BENCHMARKS / f"{name}.lox"
+        if not path.exists():
+            parser.error(f"unknown benchmark {name}")
+
+        for engine in engines:
+            try:
+                result = measure_isolated(path, engine, options.optimization, options.warmup, options.repeat)
+            except BenchmarkError as exc:
+                print(f"{name} failed on {engine}:\n{exc}", file=sys.stderr)
+                return 1
+
+            if options.json != "-":
+                report(result)
+            results.append(result)
+
+    if options.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        Path(options.json).write_text(json.dumps(results, indent=2) + "\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,92 @@
+"""
+On-disk cache for data derived from a Lox script, stored in a __loxcache__
+directory next to it like Python's __pycache__. Each entry starts with the
+hash of everything it was derived from, so a stale entry is simply ignored
+and overwritten.
+"""
+import functools
+import hashlib
+import os
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator
+
+CACHE_DIRECTORY = "__loxcache__"
+
+PACKAGE_DIRECTORY = Path(__file__).parent
+
+
+@functools.cache
+def code_version() -> str:
+    """
+    Hash of the source files of the interpreter, so entries derived by any
+    other version of the front end, the passes or the node classes are ignored
+    """
+    digest = hashlib.sha256()
+
+    for path in sorted(PACKAGE_DIRECTORY.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+def source_digest(version):
+    """
+    Hash object that source_hash feeds the source to
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{code_version()}:{version}:{sys.implementation.cache_tag}:".encode())
+    return digest
+
+
+def hashed(chunks: Iterable[str], digest) -> Iterator[str]:
+    """
+    Passes the chunks on while adding them to digest, so the source can be
+    hashed while it is being read for something else
+    """
+    for chunk in chunks:
+        digest.update(chunk.encode())
+        yield chunk
+
+
+def source_hash(source: str | Iterable[str], version) -> bytes:
+    """
+    Hash of the source, given whole or as chunks of text
+    """
+    digest = source_digest(version)
+
+    for chunk in (source, ) if isinstance(source, str) else source:
+        digest.update(chunk.encode())
+
+    return digest.digest()
+
+
+def cache_path(script, kind: str) -> Path:
+    script = Path(script)
+    return script.parent / CACHE_DIRECTORY / f"{script.name}.{kind}"
+
+
+def load(script, kind: str, key: bytes) -> bytes | None:
+    try:
+        data = cache_path(script, kind).read_bytes()
+    except OSError:
+        return None
+
+    if data[:len(key)] != key:
+        return None
+
+    return data[len(key):]
+
+
+def store(script, kind: str, key: bytes, data: bytes):
+    path = cache_path(script, kind)
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    # A read-only directory only costs the next run its compile time
+    try:
+        path.parent.mkdir(exist_ok=True)
+        temporary.write_bytes(key + data)
+        os.replace(temporary, path)
+    except OSError:
+        pass
@@ -0,0 +1,661 @@
+from lox.expr import ExprVisitor, Get, Literal, Super, Variable
+from lox.stmt import StmtVisitor
+from lox.token_type import TokenType
+from lox.environment import LocalEnvironment, UNDEFINED
+from lox.exception import RuntimeException
+from lox.interpreter import Interpreter, stack_overflow, counter_loop
+from lox.lox_callable import LoxCallable
+from lox.lox_function import LoxFunction, RETURNED, TAIL_CALL
+from lox.lox_class import LoxClass
+from lox.lox_instance import LoxInstance
+from lox.operators import BINARY, UNARY, NUMBER_BINARY, NUMBER_UNARY, EXACT_BINARY
+
+
+class ClosureInterpreter(Interpreter):
+    """
+    Interpreter that compiles every node once into a Python closure taking the
+    current environment, instead of dispatching through accept/visit_* on every
+    evaluation. Resolution and the runtime objects are shared with Interpreter.
+    """
+
+    def __init__(self, error_handler):
+        super().__init__(error_handler)
+        self.compiler = ClosureCompiler(self)
+        # Compiled function bodies keyed by the id of their statement list
+        self.bodies = {}
+
+    def interpret(self, statements):
+        try:
+            program = self.compiler.compile_block(statements)
+            program(self.globals)
+        except RuntimeException as exc:
+            self.error_handler(exc)
+        except RecursionError as exc:
+            self.error_handler(stack_overflow(exc))
+
+    def execute_block(self, statements, environment):
+        return self.bodies[id(statements)][1](environment)
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    def __init__(self, interpreter: ClosureInterpreter):
+        self.interpreter = interpreter
+
+    def compile_expr(self, expr):
+        return expr.accept(self)
+
+    def compile_stmt(self, stmt):
+        return stmt.accept(self)
+
+    def compile_block(self, statements):
+        """
+        Compiled statements return RETURNED once a 'return' ran, anything else
+        means execution continues
+        """
+        compiled = tuple(self.compile_stmt(statement) for statement in statements)
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def run(env):
+            for statement in compiled:
+                if statement(env) is RETURNED:
+                    return RETURNED
+
+        return run
+
+    def compile_function(self, stmt):
+        bodies = self.interpreter.bodies
+        if id(stmt.body) not in bodies:
+            # The statement list is kept alive next to its code so the id stays unique
+            bodies[id(stmt.body)] = (stmt.body, self.compile_block(stmt.body))
+
+    def get_local(self, distance: int, slot: int):
+        if distance == 0:
+            def get(env):
+                return env.values[slot]
+        elif distance == 1:
+            def get(env):
+                return env.enclosing.values[slot]
+        else:
+            def get(env):
+                for _ in range(distance):
+                    env = env.enclosing
+                return env.values[slot]
+
+        return get
+
+    def define(self, stmt):
+        slot = stmt.slot
+
+        if stmt.depth is None:
+            values = self.interpreter.globals.values
+
+            def define(env, value):
+                values[slot] = value
+        else:
+            def define(env, value):
+                env.values[slot] = value
+
+        return define
+
+    def variable(self, expr, token):
+        if expr.depth is not None:
+            return self.get_local(expr.depth, expr.slot)
+
+        globals = self.interpreter.globals
+        values = globals.values
+        slot = expr.slot
+
+        def get(env):
+            value = values[slot]
+            if value is UNDEFINED:
+                return globals.get(token, slot)
+            return value
+
+        return get
+
+    def visit_block_stmt(self, stmt):
+        body = self.compile_block(stmt.statements)
+        size = stmt.size
+
+        def run(env):
+            return body(LocalEnvironment(env, size))
+
+        return run
+
+    def visit_class_stmt(self, stmt):
+        name = stmt.name
+        super_class = self.compile_expr(stmt.super_class) if stmt.super_class else None
+        define = self.define(stmt)
+
+        for method in stmt.methods:
+            self.compile_function(method)
+
+        def run(env):
+            superclass = None
+            if super_class:
+                superclass = super_class(env)
+                if not isinstance(superclass, LoxClass):
+                    raise RuntimeException(stmt.super_class.name, "Superclass must be a class.")
+
+            define(env, None)
+
+            closure = env
+            if super_class:
+                closure = LocalEnvironment(env, 1)
+                closure.values[0] = superclass
+
+            methods = {}
+            for method in stmt.methods:
+                methods[method.name.lexeme] = LoxFunction(method, closure, method.name.lexeme == "init")
+
+            define(env, LoxClass(name.lexeme, superclass, methods))
+
+        return run
+
+    def visit_expression_stmt(self, stmt):
+        return self.compile_expr(stmt.expression)
+
+    def visit_function_stmt(self, stmt):
+        self.compile_function(stmt)
+        define = self.define(stmt)
+
+        def run(env):
+            define(env, LoxFunction(stmt, env, False))
+
+        return run
+
+    def visit_if_stmt(self, stmt):
+        condition = self.compile_expr(stmt.condition)
+        then_branch = self.compile_stmt(stmt.then_branch)
+
+        if not stmt.else_branch:
+            def run(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+
+            return run
+
+        else_branch = self.compile_stmt(stmt.else_branch)
+
+        def run(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+
+        return run
+
+    def visit_print_stmt(self, stmt):
+        expression = self.compile_expr(stmt.expression)
+        stringify = self.interpreter.stringify
+
+        def run(env):
+            print(stringify(expression(env)))
+
+        return run
+
+    def visit_return_stmt(self, stmt):
+        interpreter = self.interpreter
+
+        if not stmt.value:
+            def run(env):
+                interpreter.return_value = None
+                return RETURNED
+
+            return run
+
+        value = self.compile_expr(stmt.value)
+
+        def run(env):
+            interpreter.return_value = value(env)
+            return RETURNED
+
+        return run
+
+    def visit_var_stmt(self, stmt):
+        if stmt.depth is None:
+            define = self.define(stmt)
+            initializer = self.compile_expr(stmt.initializer) if stmt.initializer else None
+
+            def run(env):
+                define(env, initializer(env) if initializer else None)
+
+            return run
+
+        slot = stmt.slot
+
+        if stmt.initializer is None:
+            # Slots start out as nil
+            def run(env):
+                env.values[slot] = None
+
+            return run
+
+        initializer = self.compile_expr(stmt.initializer)
+
+        def run(env):
+            env.values[slot] = initializer(env)
+
+        return run
+
+    def visit_while_stmt(self, stmt):
+        condition = self.compile_expr(stmt.condition)
+
+        if stmt.reuse_scope:
+            return self.compile_loop(stmt, condition)
+
+        body = self.compile_stmt(stmt.body)
+
+        def run(env):
+            value = condition(env)
+            while value is not None and value is not False:
+                if body(env) is RETURNED:
+                    return RETURNED
+                value = condition(env)
+
+        return run
+
+    def compile_loop(self, stmt, condition):
+        """
+        Loop whose body block gets one environment for every iteration, with
+        its counter compared and stepped directly while it is a number
+        """
+        size = stmt.body.size
+        counter = counter_loop(stmt)
+
+        if counter is None:
+            body = self.compile_block(stmt.body.statements)
+
+            def run(env):
+                inner = LocalEnvironment(env, size)
+                value = condition(env)
+                while value is not None and value is not False:
+                    if body(inner) is RETURNED:
+                        return RETURNED
+                    value = condition(env)
+
+            return run
+
+        depth, slot, compare, bound, step = counter
+        body = self.compile_block(stmt.body.statements[:-1])
+        increment = self.compile_stmt(stmt.body.statements[-1])
+        limit = self.compile_expr(bound)
+
+        def run(env):
+            inner = LocalEnvironment(env, size)
+            values = env.ancestor(depth).values
+
+            while True:
+                value = values[slot]
+                bound = limit(env)
+
+                if type(value) is float and type(bound) is float:
+                    if not compare(value, bound):
+                        return
+                else:
+                    value = condition(env)
+                    if value is None or value is False:
+                        return
+
+                if body(inner) is RETURNED:
+                    return RETURNED
+
+                value = values[slot]
+                if type(value) is float:
+                    values[slot] = value + step
+                else:
+                    increment(inner)
+
+        return run
+
+    def visit_assign_expr(self, expr):
+        value = self.compile_expr(expr.value)
+        token = expr.name
+        slot = expr.slot
+        distance = expr.depth
+
+        if distance is None:
+            globals = self.interpreter.globals
+
+            def assign(env):
+                result = value(env)
+                globals.assign(token, slot, result)
+                return result
+        elif distance == 0:
+            def assign(env):
+                result = value(env)
+                env.values[slot] = result
+                return result
+        else:
+            def assign(env):
+                result = value(env)
+                target = env
+                for _ in range(distance):
+                    target = target.enclosing
+                target.values[slot] = result
+                return result
+
+        return assign
+
+    def visit_binary_expr(self, expr):
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+        operator = expr.operator
+
+        if operator.token_type in EXACT_BINARY:
+            compute = EXACT_BINARY[operator.token_type]
+
+            def binary(env):
+                return compute(left(env), right(env))
+
+            return binary
+
+        operation = BINARY[operator.token_type]
+        compute = NUMBER_BINARY[operator.token_type]
+
+        # A local of the current scope and a number, like n < 2, read without calling a closure for either
+        if type(expr.left) is Variable and expr.left.depth == 0 and type(expr.right) is Literal \
+                and type(expr.right.value) is float:
+            slot = expr.left.slot
+            b = expr.right.value
+
+            def binary(env):
+                a = env.values[slot]
+                if type(a) is float:
+                    return compute(a, b)
+                return operation(operator, a, b)
+
+            return binary
+
+        def binary(env):
+            a = left(env)
+            b = right(env)
+            if type(a) is float and type(b) is float:
+                return compute(a, b)
+            return operation(operator, a, b)
+
+        return binary
+
+    def visit_call_expr(self, expr):
+        # A method that is called right away is never bound
+        if type(expr.callee) is Get:
+            return self.compile_method_call(expr)
+
+        if type(expr.callee) is Super:
+            return self.compile_super_call(expr)
+
+        callee = self.compile_expr(expr.callee)
+        arguments = self.compile_arguments(expr)
+        paren = expr.paren
+        tail = expr.tail
+        interpreter = self.interpreter
+        bodies = interpreter.bodies
+
+        def call(env):
+            function = callee(env)
+            values = arguments(env)
+
+            # Calls of Lox functions skip the generic checks of LoxCallable
+            if type(function) is LoxFunction:
+                declaration = function.declaration
+                if len(values) != len(declaration.params):
+                    raise RuntimeException(paren, f"Expected {function.arity()} arguments but got {len(values)}.")
+
+                if tail:
+                    return interpreter.defer_call(function, function.instance, values)
+
+                if function.instance is not None or function.is_initializer:
+                    return function.call_method(interpreter, function.instance, values)
+
+                # A plain function runs its body in this frame, only a tail call
+                # it returns is left to the loop of call_method
+                environment = LocalEnvironment(function.closure, declaration.size)
+                environment.values[:len(values)] = values
+
+                if bodies[id(declaration.body)][1](environment) is not RETURNED:
+                    return None
+
+                value = interpreter.return_value
+                if value is not TAIL_CALL:
+                    return value
+
+                # The name function is left to the caller, the profiler reads it from this frame
+                tail_function, instance, values = interpreter.tail_call
+                return tail_function.call_method(interpreter, instance, values)
+
+            if not isinstance(function, LoxCallable):
+                raise RuntimeException(paren, "Can only call functions and classes.")
+
+            if len(values) != function.arity():
+                raise RuntimeException(paren, f"Expected {function.arity()} arguments but got {len(values)}.")
+
+            return function.call(interpreter, values)
+
+        return call
+
+    def compile_arguments(self, expr):
+        """
+        Closure evaluating the arguments of a call into a list, unrolled for the usual few
+        """
+        arguments = tuple(self.compile_expr(argument) for argument in expr.arguments)
+
+        match arguments:
+            case ():
+                def evaluate(env):
+                    return []
+            case (first, ):
+                def evaluate(env):
+                    return [first(env)]
+            case (first, second):
+                def evaluate(env):
+                    return [first(env), second(env)]
+            case (first, second, third):
+                def evaluate(env):
+                    return [first(env), second(env), third(env)]
+            case _:
+                def evaluate(env):
+                    return [argument(env) for argument in arguments]
+
+        return evaluate
+
+    def compile_method_call(self, expr):
+        object = self.compile_expr(expr.callee.object)
+        arguments = self.compile_arguments(expr)
+        name = expr.callee.name
+        lexeme = name.lexeme
+        cache = expr.callee.cache
+        paren = expr.paren
+        tail = expr.tail
+        interpreter = self.interpreter
+
+        def call(env):
+            instance = object(env)
+            if not isinstance(instance, LoxInstance):
+                raise RuntimeException(name, "Only instances have properties.")
+
+            shape = instance.shape
+            entry = cache.entry if shape is cache.shape else cache.get(shape, lexeme)
+
+            if entry is None:
+                raise RuntimeException(name, f"Undefined property {lexeme}.")
+
+            if type(entry) is not int:
+                values = arguments(env)
+
+                if len(values) != entry.arity():
+                    raise RuntimeException(paren, f"Expected {entry.arity()} arguments but got {len(values)}.")
+
+                if tail:
+                    return interpreter.defer_call(entry, instance, values)
+
+                return entry.call_method(interpreter, instance, values)
+
+            # A field holding some callable
+            function = instance.values[entry]
+            values = arguments(env)
+
+            if not isinstance(function, LoxCallable):
+                raise RuntimeException(paren, "Can only call functions and classes.")
+
+            if len(values) != function.arity():
+                raise RuntimeException(paren, f"Expected {function.arity()} arguments but got {len(values)}.")
+
+            return function.call(interpreter, values)
+
+        return call
+
+    def compile_super_call(self, expr):
+        find_method = self.compile_super_lookup(expr.callee)
+        get_this = self.get_local(expr.callee.depth - 1, 0)
+        arguments = self.compile_arguments(expr)
+        paren = expr.paren
+        tail = expr.tail
+        interpreter = self.interpreter
+
+        def call(env):
+            method = find_method(env)
+            values = arguments(env)
+
+            if len(values) != method.arity():
+                raise RuntimeException(paren, f"Expected {method.arity()} arguments but got {len(values)}.")
+
+            if tail:
+                return interpreter.defer_call(method, get_this(env), values)
+
+            return method.call_method(interpreter, get_this(env), values)
+
+        return call
+
+    def visit_get_expr(self, expr):
+        object = self.compile_expr(expr.object)
+        name = expr.name
+        lexeme = name.lexeme
+        cache = expr.cache
+
+        def get(env):
+            instance = object(env)
+            if not isinstance(instance, LoxInstance):
+                raise RuntimeException(name, "Only instances have properties.")
+
+            shape = instance.shape
+            entry = cache.entry if shape is cache.shape else cache.get(shape, lexeme)
+
+            if type(entry) is int:
+                return instance.values[entry]
+
+            if entry is None:
+                raise RuntimeException(name, f"Undefined property {lexeme}.")
+
+            return entry.bind(instance)
+
+        return get
+
+    def visit_grouping_expr(self, expr):
+        return self.compile_expr(expr.expression)
+
+    def visit_literal_expr(self, expr):
+        value = expr.value
+
+        def literal(env):
+            return value
+
+        return literal
+
+    def visit_logical_expr(self, expr):
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+
+        if expr.operator.token_type == TokenType.OR:
+            def logical(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+        else:
+            def logical(env):
+                value = left(env)
+                if value is None or value is False:
+                    return value
+                return right(env)
+
+        return logical
+
+    def visit_set_expr(self, expr):
+        object = self.compile_expr(expr.object)
+        value = self.compile_expr(expr.value)
+        name = expr.name
+        lexeme = name.lexeme
+        cache = expr.cache
+
+        def set(env):
+            instance = object(env)
+
+            if not isinstance(instance, LoxInstance):
+                raise RuntimeException(name, "Only instances have fields.")
+
+            result = value(env)
+
+            shape = instance.shape
+            entry = cache.entry if shape is cache.shape else cache.set(shape, lexeme)
+
+            if type(entry) is int:
+                instance.values[entry] = result
+            else:
+                instance.shape = entry
+                instance.values.append(result)
+
+            return result
+
+        return set
+
+    def visit_super_expr(self, expr):
+        find_method = self.compile_super_lookup(expr)
+        get_this = self.get_local(expr.depth - 1, 0)
+
+        def super_method(env):
+            return find_method(env).bind(get_this(env))
+
+        return super_method
+
+    def compile_super_lookup(self, expr):
+        get_super = self.get_local(expr.depth, expr.slot)
+        method_name = expr.method
+
+        def find_method(env):
+            method = get_super(env).find_method(method_name.lexeme)
+
+            if not method:
+                raise RuntimeException(method_name, f"Undefined property {method_name.lexeme}.")
+
+            return method
+
+        return find_method
+
+    def visit_this_expr(self, expr):
+        return self.variable(expr, expr.keyword)
+
+    def visit_unary_expr(self, expr):
+        right = self.compile_expr(expr.right)
+        operator = expr.operator
+        operation = UNARY[operator.token_type]
+        compute = NUMBER_UNARY.get(operator.token_type)
+
+        if compute is None:
+            def unary(env):
+                return operation(operator, right(env))
+
+            return unary
+
+        def unary(env):
+            value = right(env)
+            if type(value) is float:
+                return compute(value)
+            return operation(operator, value)
+
+        return unary
+
+    def visit_variable_expr(self, expr):
+        return self.variable(expr, expr.name)
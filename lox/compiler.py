@@ -0,0 +1,510 @@
+from __future__ import annotations
+
+from enum import IntEnum
+
+from lox.expr import ExprVisitor, Expr, Get, Super
+from lox.stmt import StmtVisitor
+from lox.token import Token
+from lox.token_type import TokenType
+from lox.resolver import FunctionType
+
+
+class OpCode(IntEnum):
+    CONSTANT = 0
+    POP = 1
+    GET_LOCAL = 2
+    SET_LOCAL = 3
+    GET_CELL = 4
+    SET_CELL = 5
+    BOX = 6
+    GET_UPVALUE = 7
+    SET_UPVALUE = 8
+    GET_GLOBAL = 9
+    DEFINE_GLOBAL = 10
+    SET_GLOBAL = 11
+    GET_PROPERTY = 12
+    SET_PROPERTY = 13
+    CHECK_INSTANCE = 14
+    GET_SUPER = 15
+    EQUAL = 16
+    NOT_EQUAL = 17
+    GREATER = 18
+    GREATER_EQUAL = 19
+    LESS = 20
+    LESS_EQUAL = 21
+    ADD = 22
+    SUBTRACT = 23
+    MULTIPLY = 24
+    DIVIDE = 25
+    NOT = 26
+    NEGATE = 27
+    PRINT = 28
+    JUMP = 29
+    JUMP_IF_FALSE = 30
+    JUMP_IF_FALSE_OR_POP = 31
+    JUMP_IF_TRUE_OR_POP = 32
+    CALL = 33
+    LOAD_METHOD = 34
+    LOAD_SUPER_METHOD = 35
+    CALL_METHOD = 36
+    CLOSURE = 37
+    CHECK_SUPERCLASS = 38
+    CLASS = 39
+    RETURN = 40
+    NOP = 41
+    # A GET_LOCAL fused with the GET_PROPERTY after it, like this.name
+    GET_LOCAL_PROPERTY = 42
+
+
+JUMPS = (OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_FALSE_OR_POP, OpCode.JUMP_IF_TRUE_OR_POP)
+
+BINARY_OPS = {
+    TokenType.BANG_EQUAL    : OpCode.NOT_EQUAL,
+    TokenType.EQUAL_EQUAL   : OpCode.EQUAL,
+    TokenType.GREATER       : OpCode.GREATER,
+    TokenType.GREATER_EQUAL : OpCode.GREATER_EQUAL,
+    TokenType.LESS          : OpCode.LESS,
+    TokenType.LESS_EQUAL    : OpCode.LESS_EQUAL,
+    TokenType.MINUS         : OpCode.SUBTRACT,
+    TokenType.PLUS          : OpCode.ADD,
+    TokenType.SLASH         : OpCode.DIVIDE,
+    TokenType.STAR          : OpCode.MULTIPLY,
+}
+
+
+class VMFunction:
+    """
+    Compiled function prototype. Instructions are (opcode, operand) pairs with
+    operands stored inline, and `tokens` holds the source token of every
+    instruction for runtime error reporting.
+    """
+    def __init__(self, name: str, arity: int):
+        self.name = name
+        self.arity = arity
+        self.code = []
+        self.tokens = []
+        # Parameter slots captured by closures, boxed into cells on entry
+        self.cells = ()
+
+    def __str__(self):
+        if self.name is None:
+            return "<script>"
+        return f"<fn {self.name}>"
+
+
+class Local:
+    def __init__(self, name: str, depth: int, slot: int):
+        self.name = name
+        self.depth = depth
+        self.slot = slot
+        self.captured = False
+        # Index of the NOP placeholder that becomes a BOX once the local is captured
+        self.declaration = None
+        # Instructions reading or writing the local, patched to cell access on capture
+        self.uses = []
+
+
+class FunctionState:
+    def __init__(self, enclosing: FunctionState | None, function: VMFunction, function_type: FunctionType):
+        self.enclosing = enclosing
+        self.function = function
+        self.function_type = function_type
+        self.locals = []
+        self.upvalues = []
+        self.scope_depth = 0
+        # Slot zero and the parameters, which are in place before the body runs
+        self.parameters = function.arity + 1
+
+
+class Compiler(ExprVisitor, StmtVisitor):
+    """
+    Lowers a resolved program into VMFunction bytecode for the VM.
+
+    Locals live in stack slots of their call frame. A local captured by a
+    closure is boxed into a cell at its declaration, which is detected while
+    compiling the capturing function and patched into the already emitted code.
+    """
+
+    def __init__(self):
+        self.state = None
+
+    def compile(self, statements) -> VMFunction:
+        self.state = FunctionState(None, VMFunction(None, 0), FunctionType.NONE)
+        # Slot zero holds the callee, as in every other frame
+        self.state.locals.append(Local("", 0, 0))
+
+        for statement in statements:
+            self.compile_stmt(statement)
+
+        self.emit(OpCode.CONSTANT, None)
+        self.emit(OpCode.RETURN)
+        return self.end_function()
+
+    def compile_stmt(self, stmt):
+        stmt.accept(self)
+
+    def compile_expr(self, expr):
+        expr.accept(self)
+
+    def emit(self, op: OpCode, operand=None, token: Token | None = None) -> int:
+        function = self.state.function
+        function.code.append((op, operand))
+        function.tokens.append(token)
+        return len(function.code) - 1
+
+    def emit_jump(self, op: OpCode, token: Token | None = None) -> int:
+        return self.emit(op, -1, token)
+
+    def patch_jump(self, index: int):
+        code = self.state.function.code
+        code[index] = (code[index][0], len(code))
+
+    def end_function(self) -> VMFunction:
+        function = self.state.function
+        function.cells = tuple(local.slot for local in self.state.locals[:self.state.parameters] if local.captured)
+        self.fuse(function)
+        self.strip_nops(function)
+        self.state = self.state.enclosing
+        return function
+
+    def fuse(self, function: VMFunction):
+        # Runs once captured locals were patched to cells, and leaves NOPs
+        # behind for strip_nops to drop. No jump may land between the two.
+        code = function.code
+        targets = {operand for op, operand in code if op in JUMPS}
+
+        for index in range(len(code) - 1):
+            (op, slot), (next_op, name) = code[index], code[index + 1]
+
+            if op == OpCode.GET_LOCAL and next_op == OpCode.GET_PROPERTY and index + 1 not in targets:
+                code[index] = (OpCode.GET_LOCAL_PROPERTY, (slot, name))
+                function.tokens[index] = function.tokens[index + 1]
+                code[index + 1] = (OpCode.NOP, None)
+
+    def strip_nops(self, function: VMFunction):
+        # Placeholders of locals that were never captured are dropped and
+        # jump targets are relocated accordingly
+        relocated = []
+        position = 0
+        for op, _ in function.code:
+            relocated.append(position)
+            if op != OpCode.NOP:
+                position += 1
+        relocated.append(position)
+
+        code, tokens = [], []
+        for (op, operand), token in zip(function.code, function.tokens):
+            if op == OpCode.NOP:
+                continue
+            if op in JUMPS:
+                operand = relocated[operand]
+            code.append((int(op), operand))
+            tokens.append(token)
+
+        function.code = code
+        function.tokens = tokens
+
+    def begin_scope(self):
+        self.state.scope_depth += 1
+
+    def end_scope(self):
+        state = self.state
+        state.scope_depth -= 1
+
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            state.locals.pop()
+            self.emit(OpCode.POP)
+
+    def add_local(self, name: str) -> Local:
+        local = Local(name, self.state.scope_depth, len(self.state.locals))
+        self.state.locals.append(local)
+        return local
+
+    def declare_local(self, name: str) -> Local:
+        # The value is already in the local's stack slot, only the boxing placeholder is left
+        local = self.add_local(name)
+        local.declaration = self.emit(OpCode.NOP)
+        return local
+
+    def find_local(self, state: FunctionState, name: str) -> Local | None:
+        for local in reversed(state.locals):
+            if local.name == name:
+                return local
+        return None
+
+    def capture(self, local: Local, state: FunctionState):
+        if local.captured:
+            return
+
+        local.captured = True
+        code = state.function.code
+
+        if local.declaration is not None:
+            code[local.declaration] = (OpCode.BOX, local.slot)
+
+        for index in local.uses:
+            op, operand = code[index]
+            code[index] = (OpCode.GET_CELL if op == OpCode.GET_LOCAL else OpCode.SET_CELL, operand)
+
+    def find_upvalue(self, state: FunctionState, name: str) -> int:
+        if state.enclosing is None:
+            return -1
+
+        local = self.find_local(state.enclosing, name)
+        if local:
+            self.capture(local, state.enclosing)
+            return self.add_upvalue(state, True, local.slot)
+
+        index = self.find_upvalue(state.enclosing, name)
+        if index != -1:
+            return self.add_upvalue(state, False, index)
+
+        return -1
+
+    def add_upvalue(self, state: FunctionState, is_local: bool, index: int) -> int:
+        upvalue = (is_local, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+
+        state.upvalues.append(upvalue)
+        return len(state.upvalues) - 1
+
+    def get_variable(self, name: str, token: Token, expr: Expr | None):
+        if expr is not None and expr.depth is None:
+            self.emit(OpCode.GET_GLOBAL, name, token)
+            return
+
+        local = self.find_local(self.state, name)
+        if local:
+            if local.captured:
+                self.emit(OpCode.GET_CELL, local.slot, token)
+            else:
+                local.uses.append(self.emit(OpCode.GET_LOCAL, local.slot, token))
+            return
+
+        self.emit(OpCode.GET_UPVALUE, self.find_upvalue(self.state, name), token)
+
+    def set_variable(self, name: str, token: Token, expr: Expr | None):
+        if expr is not None and expr.depth is None:
+            self.emit(OpCode.SET_GLOBAL, name, token)
+            return
+
+        local = self.find_local(self.state, name)
+        if local:
+            if local.captured:
+                self.emit(OpCode.SET_CELL, local.slot, token)
+            else:
+                local.uses.append(self.emit(OpCode.SET_LOCAL, local.slot, token))
+            return
+
+        self.emit(OpCode.SET_UPVALUE, self.find_upvalue(self.state, name), token)
+
+    def define_variable(self, name: Token):
+        # Globals are stored by name, locals simply stay in their stack slot
+        if self.state.scope_depth == 0:
+            self.emit(OpCode.DEFINE_GLOBAL, name.lexeme, name)
+        else:
+            self.declare_local(name.lexeme)
+
+    def function(self, stmt, function_type: FunctionType, boxed: Local | None = None):
+        function = VMFunction(stmt.name.lexeme, len(stmt.params))
+        self.state = FunctionState(self.state, function, function_type)
+        self.begin_scope()
+
+        # Slot zero holds 'this' for methods and the callee itself otherwise
+        self.add_local("this" if function_type in (FunctionType.METHOD, FunctionType.INITIALIZER) else "")
+        for param in stmt.params:
+            self.add_local(param.lexeme)
+
+        for statement in stmt.body:
+            self.compile_stmt(statement)
+
+        self.emit_return()
+
+        upvalues = tuple(self.state.upvalues)
+        function = self.end_function()
+        # A local function captured by its own body is pushed already boxed in a cell
+        self.emit(OpCode.CLOSURE, (function, upvalues, boxed is not None and boxed.captured), stmt.name)
+
+    def emit_return(self):
+        if self.state.function_type == FunctionType.INITIALIZER:
+            self.get_variable("this", None, None)
+        else:
+            self.emit(OpCode.CONSTANT, None)
+        self.emit(OpCode.RETURN)
+
+    def visit_block_stmt(self, stmt):
+        self.begin_scope()
+        for statement in stmt.statements:
+            self.compile_stmt(statement)
+        self.end_scope()
+
+    def visit_class_stmt(self, stmt):
+        is_global = self.state.scope_depth == 0
+
+        if stmt.super_class:
+            if is_global:
+                self.begin_scope()
+            self.compile_expr(stmt.super_class)
+            self.emit(OpCode.CHECK_SUPERCLASS, None, stmt.super_class.name)
+            self.declare_local("super")
+
+        self.emit(OpCode.CONSTANT, None)
+        if is_global:
+            self.emit(OpCode.DEFINE_GLOBAL, stmt.name.lexeme, stmt.name)
+        else:
+            self.declare_local(stmt.name.lexeme)
+
+        if stmt.super_class:
+            self.get_variable("super", None, None)
+
+        for method in stmt.methods:
+            function_type = FunctionType.METHOD
+            if method.name.lexeme == "init":
+                function_type = FunctionType.INITIALIZER
+            self.function(method, function_type)
+
+        names = tuple(method.name.lexeme for method in stmt.methods)
+        self.emit(OpCode.CLASS, (stmt.name.lexeme, names, stmt.super_class is not None), stmt.name)
+        if is_global:
+            self.emit(OpCode.SET_GLOBAL, stmt.name.lexeme, stmt.name)
+        else:
+            self.set_variable(stmt.name.lexeme, stmt.name, None)
+        self.emit(OpCode.POP)
+
+        if stmt.super_class and is_global:
+            self.end_scope()
+
+    def visit_expression_stmt(self, stmt):
+        self.compile_expr(stmt.expression)
+        self.emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt):
+        if self.state.scope_depth == 0:
+            self.function(stmt, FunctionType.FUNCTION)
+            self.emit(OpCode.DEFINE_GLOBAL, stmt.name.lexeme, stmt.name)
+            return
+
+        # Declared before compiling the body so the function can refer to itself
+        local = self.add_local(stmt.name.lexeme)
+        self.function(stmt, FunctionType.FUNCTION, local)
+
+        if not local.captured:
+            local.declaration = self.emit(OpCode.NOP)
+
+    def visit_if_stmt(self, stmt):
+        self.compile_expr(stmt.condition)
+        then_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.compile_stmt(stmt.then_branch)
+
+        if stmt.else_branch:
+            else_jump = self.emit_jump(OpCode.JUMP)
+            self.patch_jump(then_jump)
+            self.compile_stmt(stmt.else_branch)
+            self.patch_jump(else_jump)
+        else:
+            self.patch_jump(then_jump)
+
+    def visit_print_stmt(self, stmt):
+        self.compile_expr(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value:
+            self.compile_expr(stmt.value)
+            self.emit(OpCode.RETURN)
+        else:
+            self.emit_return()
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            self.compile_expr(stmt.initializer)
+        else:
+            self.emit(OpCode.CONSTANT, None)
+
+        self.define_variable(stmt.name)
+
+    def visit_while_stmt(self, stmt):
+        loop_start = len(self.state.function.code)
+        self.compile_expr(stmt.condition)
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.compile_stmt(stmt.body)
+        self.emit(OpCode.JUMP, loop_start)
+        self.patch_jump(exit_jump)
+
+    def visit_assign_expr(self, expr):
+        self.compile_expr(expr.value)
+        self.set_variable(expr.name.lexeme, expr.name, expr)
+
+    def visit_binary_expr(self, expr):
+        self.compile_expr(expr.left)
+        self.compile_expr(expr.right)
+        self.emit(BINARY_OPS[expr.operator.token_type], None, expr.operator)
+
+    def visit_call_expr(self, expr):
+        callee = expr.callee
+        if isinstance(callee, Get):
+            # Method calls skip allocating a bound method
+            self.compile_expr(callee.object)
+            self.emit(OpCode.LOAD_METHOD, callee.name.lexeme, callee.name)
+        elif isinstance(callee, Super):
+            self.get_variable("this", callee.keyword, callee)
+            self.get_variable("super", callee.keyword, callee)
+            self.emit(OpCode.LOAD_SUPER_METHOD, callee.method.lexeme, callee.method)
+        else:
+            self.compile_expr(callee)
+            for argument in expr.arguments:
+                self.compile_expr(argument)
+            self.emit(OpCode.CALL, len(expr.arguments), expr.paren)
+            return
+
+        for argument in expr.arguments:
+            self.compile_expr(argument)
+        self.emit(OpCode.CALL_METHOD, len(expr.arguments), expr.paren)
+
+    def visit_get_expr(self, expr):
+        self.compile_expr(expr.object)
+        self.emit(OpCode.GET_PROPERTY, expr.name.lexeme, expr.name)
+
+    def visit_grouping_expr(self, expr):
+        self.compile_expr(expr.expression)
+
+    def visit_literal_expr(self, expr):
+        self.emit(OpCode.CONSTANT, expr.value)
+
+    def visit_logical_expr(self, expr):
+        self.compile_expr(expr.left)
+
+        if expr.operator.token_type == TokenType.OR:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_TRUE_OR_POP)
+        else:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE_OR_POP)
+
+        self.compile_expr(expr.right)
+        self.patch_jump(end_jump)
+
+    def visit_set_expr(self, expr):
+        self.compile_expr(expr.object)
+        # The object is checked before the value is evaluated, like the tree walker does
+        self.emit(OpCode.CHECK_INSTANCE, None, expr.name)
+        self.compile_expr(expr.value)
+        self.emit(OpCode.SET_PROPERTY, expr.name.lexeme, expr.name)
+
+    def visit_super_expr(self, expr):
+        self.get_variable("this", expr.keyword, expr)
+        self.get_variable("super", expr.keyword, expr)
+        self.emit(OpCode.GET_SUPER, expr.method.lexeme, expr.method)
+
+    def visit_this_expr(self, expr):
+        self.get_variable("this", expr.keyword, expr)
+
+    def visit_unary_expr(self, expr):
+        self.compile_expr(expr.right)
+
+        if expr.operator.token_type == TokenType.BANG:
+            self.emit(OpCode.NOT, None, expr.operator)
+        else:
+            self.emit(OpCode.NEGATE, None, expr.operator)
+
+    def visit_variable_expr(self, expr):
+        self.get_variable(expr.name.lexeme, expr.name, expr)
@@ -3,33 +3,56 @@ from __future__ import annotations
 from lox.token import Token
 from lox.exception import RuntimeException
 
+# Value of a global slot whose name was interned but never defined
+UNDEFINED = object()
+
 class Environment:
-    def __init__(self, enclosing: Environment | None = None):
-        self.values = dict()
-        self.enclosing = enclosing
+    """
+    Global scope. Every global name is interned to a slot of one list when it
+    is resolved, so lookups are indexed and only an UNDEFINED slot needs the
+    name again, for the error.
+    """
+    def __init__(self):
+        self.slots = dict()
+        self.values = []
+
+    def intern(self, name: str) -> int:
+        slot = self.slots.get(name)
+
+        if slot is None:
+            slot = self.slots[name] = len(self.values)
+            self.values.append(UNDEFINED)
 
-    def get(self, name: Token):
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
+        return slot
 
-        if self.enclosing:
-            return self.enclosing.get(name)
+    def get(self, name: Token, slot: int):
+        value = self.values[slot]
 
-        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+        if value is UNDEFINED:
+            raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
 
-    def assign(self, name: Token, value):
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
+        return value
 
-        if self.enclosing:
-            self.enclosing.assign(name, value)
-            return
+    def assign(self, name: Token, slot: int, value):
+        if self.values[slot] is UNDEFINED:
+            raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
 
-        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+        self.values[slot] = value
 
-    def define(self, name, value):
-        self.values[name] = value
+    def define(self, name: str, value):
+        self.values[self.intern(name)] = value
+
+
+class LocalEnvironment:
+    """
+    Block or function scope. Its variables live in a list indexed by the slot
+    the Resolver gave them, sized once when the scope is entered.
+    """
+    __slots__ = ("values", "enclosing")
+
+    def __init__(self, enclosing: LocalEnvironment | Environment, size: int):
+        self.values = [None] * size
+        self.enclosing = enclosing
 
     def ancestor(self, distance: int):
         environment = self
@@ -38,8 +61,8 @@ class Environment:
 
         return environment
 
-    def get_at(self, distance: int, name: str):
-        return self.ancestor(distance).values[name]
+    def get_at(self, distance: int, slot: int):
+        return self.ancestor(distance).values[slot]
 
-    def assign_at(self, distance: int, name: Token, value):
-        self.ancestor(distance).values[name.lexeme] = value
+    def assign_at(self, distance: int, slot: int, value):
+        self.ancestor(distance).values[slot] = value
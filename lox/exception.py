@@ -7,8 +7,3 @@ class RuntimeException(Exception):
         self.token = token
         super().__init__(f"{message}")
 
-
-class Return(RuntimeError):
-    def __init__(self, value):
-        super().__init__()
-        self.value = value
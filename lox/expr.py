@@ -57,45 +57,66 @@ class ExprVisitor(ABC):
 
 
 class Expr(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor: ExprVisitor):
         pass
 
 class Assign(Expr):
+    __slots__ = ("name", "value", "depth", "slot")
+
     def __init__(self, name: Token, value: Expr):
         self.name = name
         self.value = value
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_assign_expr(self)
 
 class Binary(Expr):
+    __slots__ = ("left", "operator", "right", "operation")
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left = left
         self.operator = operator
         self.right = right
+        # Filled in by the resolver
+        self.operation = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_binary_expr(self)
 
 class Call(Expr):
+    __slots__ = ("callee", "paren", "arguments", "tail")
+
     def __init__(self, callee: Expr, paren: Token, arguments: List[Expr]):
         self.callee = callee
         self.paren = paren
         self.arguments = arguments
+        # Filled in by the resolver
+        self.tail = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_call_expr(self)
 
 class Get(Expr):
+    __slots__ = ("object", "name", "cache")
+
     def __init__(self, object: Expr, name: Token):
         self.object = object
         self.name = name
+        # Filled in by the resolver
+        self.cache = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_get_expr(self)
 
 class Grouping(Expr):
+    __slots__ = ("expression", )
+
     def __init__(self, expression: Expr):
         self.expression = expression
 
@@ -103,6 +124,8 @@ class Grouping(Expr):
         return visitor.visit_grouping_expr(self)
 
 class Literal(Expr):
+    __slots__ = ("value", )
+
     def __init__(self, value: object):
         self.value = value
 
@@ -110,6 +133,8 @@ class Literal(Expr):
         return visitor.visit_literal_expr(self)
 
 class Logical(Expr):
+    __slots__ = ("left", "operator", "right")
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left = left
         self.operator = operator
@@ -119,40 +144,63 @@ class Logical(Expr):
         return visitor.visit_logical_expr(self)
 
 class Set(Expr):
+    __slots__ = ("object", "name", "value", "cache")
+
     def __init__(self, object: Expr, name: Token, value: Expr):
         self.object = object
         self.name = name
         self.value = value
+        # Filled in by the resolver
+        self.cache = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_set_expr(self)
 
 class Super(Expr):
+    __slots__ = ("keyword", "method", "depth", "slot")
+
     def __init__(self, keyword: Token, method: Token):
         self.keyword = keyword
         self.method = method
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_super_expr(self)
 
 class This(Expr):
+    __slots__ = ("keyword", "depth", "slot")
+
     def __init__(self, keyword: Token):
         self.keyword = keyword
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_this_expr(self)
 
 class Unary(Expr):
+    __slots__ = ("operator", "right", "operation")
+
     def __init__(self, operator: Token, right: Expr):
         self.operator = operator
         self.right = right
+        # Filled in by the resolver
+        self.operation = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_unary_expr(self)
 
 class Variable(Expr):
+    __slots__ = ("name", "depth", "slot")
+
     def __init__(self, name: Token):
         self.name = name
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor: ExprVisitor):
         return visitor.visit_variable_expr(self)
@@ -0,0 +1,197 @@
+"""
+Interpreter that counts what the program does, enabled by --count.
+
+CountingInterpreter counts the evaluations of every node, and for every Lox
+function its calls and the environments, instances and bound methods it
+allocates. Counts per line are summed from the nodes when the report is made.
+Only this subclass does any counting, so the Interpreter runs as fast as ever
+without it. Loops run without their counter fast path, and the program is not
+fused, so every node is evaluated, and counted, on its own.
+"""
+import json
+from collections import Counter, defaultdict
+
+from lox.interpreter import Interpreter
+from lox.lox_class import LoxClass
+from lox.stmt import Function
+from lox.optimizer import children
+from lox.profiler import SCRIPT, node_line
+
+ALLOCATIONS = ("environments", "instances", "bound_methods")
+
+
+class CountedClass(LoxClass):
+    """
+    Class whose instances are counted by the CountingInterpreter creating them
+    """
+
+    def call(self, interpreter, arguments):
+        interpreter.allocate("instances")
+        return super().call(interpreter, arguments)
+
+
+def subtree_line(node):
+    """
+    Line of the token of node, else of the first node below it with one
+    """
+    line = node_line(node)
+
+    if line is None:
+        for child in children(node):
+            line = subtree_line(child)
+            if line is not None:
+                break
+
+    return line
+
+
+def collect_lines(node, parent_line, lines: dict):
+    """
+    Stores the line of node and of every node below it in lines, nodes
+    without a token anywhere below them, like literals, take their parent's
+    """
+    line = subtree_line(node) or parent_line
+    lines[node] = line
+
+    for child in children(node):
+        collect_lines(child, line, lines)
+
+
+def node_name(node) -> str:
+    """
+    Name of the node class generated for node, rather than of its quickened or fused subclass
+    """
+    for klass in type(node).__mro__:
+        if klass.__module__ in ("lox.expr", "lox.stmt"):
+            return klass.__name__
+
+    return type(node).__name__
+
+
+class CountingInterpreter(Interpreter):
+
+    def __init__(self, error_handler):
+        super().__init__(error_handler)
+        self.nodes = Counter()
+        self.calls = Counter()
+        # Allocations of every function, None for the top level code
+        self.allocations = defaultdict(Counter)
+        # Function of every body, keyed by the id of its statement list
+        self.bodies = {}
+        self.names = {None: SCRIPT}
+        self.functions = [None]
+        self.statements = []
+
+    def interpret(self, statements):
+        self.statements.extend(statements)
+        super().interpret(statements)
+
+    def evaluate(self, expr):
+        self.nodes[expr] += 1
+        return expr.accept(self)
+
+    def execute(self, statement):
+        self.nodes[statement] += 1
+        return statement.accept(self)
+
+    def allocate(self, kind: str):
+        self.allocations[self.functions[-1]][kind] += 1
+
+    def execute_block(self, statements, environment):
+        function = self.bodies.get(id(statements))
+
+        if function is None:
+            return super().execute_block(statements, environment)
+
+        # The environment of the call was just made for the body
+        self.calls[function] += 1
+        self.functions.append(function)
+        self.allocate("environments")
+
+        try:
+            return super().execute_block(statements, environment)
+        finally:
+            self.functions.pop()
+
+    def define(self, stmt, value):
+        if type(value) is LoxClass:
+            value.__class__ = CountedClass
+            for method in stmt.methods:
+                self.register(method, f"{stmt.name.lexeme}.{method.name.lexeme}")
+        elif type(stmt) is Function:
+            self.register(stmt, stmt.name.lexeme)
+
+        super().define(stmt, value)
+
+    def register(self, function, name: str):
+        self.bodies[id(function.body)] = function
+        self.names[function] = name
+
+    def visit_block_stmt(self, stmt):
+        self.allocate("environments")
+        return super().visit_block_stmt(stmt)
+
+    def visit_class_stmt(self, stmt):
+        if stmt.super_class:
+            # The environment holding 'super'
+            self.allocate("environments")
+        return super().visit_class_stmt(stmt)
+
+    def run_loop(self, stmt):
+        self.allocate("environments")
+        return super().run_loop(stmt)
+
+    def counter_loop(self, stmt):
+        # Stepping the counter directly would skip counting the condition and increment
+        return None
+
+    def bind_method(self, method, object):
+        self.allocate("bound_methods")
+        return super().bind_method(method, object)
+
+    def results(self) -> dict:
+        node_lines = {}
+        for statement in self.statements:
+            collect_lines(statement, None, node_lines)
+
+        lines = Counter()
+        for node, count in self.nodes.items():
+            lines[node_lines[node]] += count
+
+        functions = []
+        for function, name in self.names.items():
+            allocations = self.allocations[function]
+            functions.append({
+                "function": name,
+                "line": function.name.line if function else None,
+                "calls": self.calls[function],
+                **{kind: allocations[kind] for kind in ALLOCATIONS},
+            })
+
+        return {
+            "nodes": [{"node": node_name(node), "line": node_lines[node], "count": count}
+                      for node, count in self.nodes.most_common()],
+            "lines": [{"line": line, "count": count} for line, count in lines.most_common()],
+            "functions": sorted(functions, key=lambda entry: entry["calls"], reverse=True),
+        }
+
+    def report(self, file, limit: int = 20):
+        results = self.results()
+
+        print(f"{'calls':>10} {'envs':>10} {'instances':>10} {'bound':>10}  function", file=file)
+        for entry in results["functions"][:limit]:
+            print(f"{entry['calls']:10} {entry['environments']:10} {entry['instances']:10} "
+                  f"{entry['bound_methods']:10}  {entry['function']}", file=file)
+
+        print(f"\n{'count':>10}  line", file=file)
+        for entry in results["lines"][:limit]:
+            print(f"{entry['count']:10}  {entry['line']}", file=file)
+
+        print(f"\n{'count':>10}  node", file=file)
+        for entry in results["nodes"][:limit]:
+            print(f"{entry['count']:10}  {entry['node']} at line {entry['line']}", file=file)
+
+    def write_json(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.results(), file, indent=2)
+            file.write("\n")
@@ -1,15 +1,85 @@
 import time
 
-from lox.expr import ExprVisitor, Expr
-from lox.stmt import StmtVisitor
+from lox.expr import ExprVisitor, Expr, Assign, Binary, Call, Get, Literal, Super, Variable
+from lox.stmt import StmtVisitor, Expression
 from lox.token_type import TokenType
 from lox.token import Token
-from lox.environment import Environment
-from lox.exception import RuntimeException, Return
+from lox.environment import Environment, LocalEnvironment, UNDEFINED
+from lox.exception import RuntimeException
 from lox.lox_callable import LoxCallable
-from lox.lox_function import LoxFunction
+from lox.lox_function import LoxFunction, RETURNED, TAIL_CALL
 from lox.lox_class import LoxClass
 from lox.lox_instance import LoxInstance
+from lox.quickening import quicken, deoptimize
+from lox.operators import NUMBER_BINARY
+
+COMPARISONS = {
+    token_type: NUMBER_BINARY[token_type]
+    for token_type in (TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL)
+}
+
+STEPS = {
+    TokenType.PLUS: 1.0,
+    TokenType.MINUS: -1.0,
+}
+
+
+def counter_loop(stmt):
+    """
+    Depth and slot of the local counter, comparison, bound and step of a
+    loop like 'for (...; i < n; i = i + 1)' whose scope is reused, else None
+    """
+    condition = stmt.condition
+
+    if not (stmt.reuse_scope and isinstance(condition, Binary) and condition.operator.token_type in COMPARISONS):
+        return None
+
+    counter = condition.left
+    bound = condition.right
+
+    if type(counter) is not Variable or counter.depth is None or type(bound) not in (Literal, Variable):
+        return None
+
+    statements = stmt.body.statements
+    increment = statements[-1].expression if statements and type(statements[-1]) is Expression else None
+
+    # The increment runs in the body's block, one scope further from the counter
+    if not (isinstance(increment, Assign) and increment.depth == counter.depth + 1 and increment.slot == counter.slot):
+        return None
+
+    step = increment.value
+
+    if not (isinstance(step, Binary) and step.operator.token_type in STEPS and type(step.left) is Variable
+            and step.left.depth == increment.depth and step.left.slot == increment.slot
+            and type(step.right) is Literal and type(step.right.value) is float):
+        return None
+
+    return (counter.depth, counter.slot, COMPARISONS[condition.operator.token_type], bound,
+            STEPS[step.operator.token_type] * step.right.value)
+
+
+def call_token(exc: RecursionError) -> Token:
+    """
+    Token of the innermost Lox call that was running when Python's stack ran out
+    """
+    token = Token(TokenType.EOF, "", None, 0)
+    traceback = exc.__traceback__
+
+    while traceback:
+        names = traceback.tb_frame.f_locals
+        # Calls are made by visitors of Call nodes, fused ones included, or by closures holding their paren
+        if isinstance(names.get("expr"), Call):
+            token = names["expr"].paren
+        elif type(names.get("paren")) is Token:
+            token = names["paren"]
+        traceback = traceback.tb_next
+
+    return token
+
+
+def stack_overflow(exc: RecursionError) -> RuntimeException:
+    return RuntimeException(call_token(exc), "Stack overflow.")
+
 
 class Interpreter(ExprVisitor, StmtVisitor):
 
@@ -17,7 +87,9 @@ class Interpreter(ExprVisitor, StmtVisitor):
         self.error_handler = error_handler
         self.globals       = Environment()
         self.environment   = self.globals
-        self.locals        = {}
+        self.return_value  = None
+        # Function, receiver and arguments of the pending tail call
+        self.tail_call     = None
 
         # Create a concrete LoxCallable class for clock
         class _(LoxCallable):
@@ -36,10 +108,7 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return expr.accept(self)
 
     def execute(self, statement):
-        statement.accept(self)
-
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
+        return statement.accept(self)
 
     def execute_block(self, statements, environment):
         previous = self.environment
@@ -47,12 +116,13 @@ class Interpreter(ExprVisitor, StmtVisitor):
             self.environment = environment
 
             for statement in statements:
-                self.execute(statement)
+                if self.execute(statement) is RETURNED:
+                    return RETURNED
         finally:
             self.environment = previous
 
     def visit_block_stmt(self, stmt):
-        self.execute_block(stmt.statements, Environment(self.environment))
+        return self.execute_block(stmt.statements, LocalEnvironment(self.environment, stmt.size))
     
     def visit_class_stmt(self, stmt):
         super_class = None
@@ -61,11 +131,11 @@ class Interpreter(ExprVisitor, StmtVisitor):
             if not isinstance(super_class, LoxClass):
                 raise RuntimeException(stmt.super_class.name, "Superclass must be a class.")
             
-        self.environment.define(stmt.name.lexeme, None)
+        self.define(stmt, None)
 
         if stmt.super_class:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", super_class)
+            self.environment = LocalEnvironment(self.environment, 1)
+            self.environment.values[0] = super_class
 
         methods = {}
         for method in stmt.methods:
@@ -73,27 +143,64 @@ class Interpreter(ExprVisitor, StmtVisitor):
             methods[method.name.lexeme] = function
         
         klass = LoxClass(stmt.name.lexeme, super_class, methods)
-        self.environment.assign(stmt.name, klass)
+
+        if stmt.super_class:
+            self.environment = self.environment.enclosing
+
+        self.define(stmt, klass)
     
     def visit_get_expr(self, expr):
         object = self.evaluate(expr.object)
-        if isinstance(object, LoxInstance):
-            return object.get(expr.name)
+        entry = self.find_property(expr, object)
+
+        if type(entry) is int:
+            return object.values[entry]
+
+        return self.bind_method(entry, object)
+
+    def visit_this_get_expr(self, expr):
+        object = self.environment.get_at(expr.object.depth, expr.object.slot)
+        entry = self.find_property(expr, object)
+
+        if type(entry) is int:
+            return object.values[entry]
+
+        return self.bind_method(entry, object)
+
+    def bind_method(self, method, object):
+        """
+        Method read without calling it right away, which needs a bound copy
+        """
+        return method.bind(object)
+
+    def find_property(self, expr, object):
+        """
+        Slot of the field or the unbound method that expr reads from object
+        """
+        if not isinstance(object, LoxInstance):
+            raise RuntimeException(expr.name, "Only instances have properties.")
 
-        raise RuntimeException(expr.name, "Only instances have properties.")
+        shape = object.shape
+        cache = expr.cache
+        entry = cache.entry if shape is cache.shape else cache.get(shape, expr.name.lexeme)
+
+        if entry is None:
+            raise RuntimeException(expr.name, f"Undefined property {expr.name.lexeme}.")
+
+        return entry
 
     def visit_expression_stmt(self, stmt):
         self.evaluate(stmt.expression)
 
     def visit_function_stmt(self, stmt):
         function = LoxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
+        self.define(stmt, function)
 
     def visit_if_stmt(self, stmt):
         if self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.then_branch)
+            return self.execute(stmt.then_branch)
         elif stmt.else_branch:
-            self.execute(stmt.else_branch)
+            return self.execute(stmt.else_branch)
 
     def visit_print_stmt(self, stmt):
         value = self.evaluate(stmt.expression)
@@ -104,29 +211,102 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if stmt.value:
             value = self.evaluate(stmt.value)
 
-        raise Return(value)
+        self.return_value = value
+        return RETURNED
 
     def visit_var_stmt(self, stmt):
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
 
-        self.environment.define(stmt.name.lexeme, value)
+        self.define(stmt, value)
+
+    def define(self, stmt, value):
+        if stmt.depth is None:
+            self.globals.values[stmt.slot] = value
+        else:
+            self.environment.values[stmt.slot] = value
 
     def visit_while_stmt(self, stmt):
+        if stmt.reuse_scope:
+            return self.run_loop(stmt)
+
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            if self.execute(stmt.body) is RETURNED:
+                return RETURNED
+
+    def run_loop(self, stmt):
+        """
+        Runs a loop whose body block gets one environment for every iteration,
+        with its counter compared and stepped directly while it is a number
+        """
+        previous = self.environment
+        environment = LocalEnvironment(previous, stmt.body.size)
+        statements = stmt.body.statements
+        counter = self.counter_loop(stmt)
+
+        if counter is None:
+            while self.is_truthy(self.evaluate(stmt.condition)):
+                self.environment = environment
+                try:
+                    for statement in statements:
+                        if self.execute(statement) is RETURNED:
+                            return RETURNED
+                finally:
+                    self.environment = previous
+            return
 
-        return None
+        depth, slot, compare, bound, step = counter
+        values = previous.ancestor(depth).values
+        increment = statements[-1]
+        statements = statements[:-1]
+
+        while True:
+            value = values[slot]
+            limit = bound.value if type(bound) is Literal else self.evaluate(bound)
+
+            if type(value) is float and type(limit) is float:
+                if not compare(value, limit):
+                    return
+            elif not self.is_truthy(self.evaluate(stmt.condition)):
+                return
+
+            self.environment = environment
+            try:
+                for statement in statements:
+                    if self.execute(statement) is RETURNED:
+                        return RETURNED
+
+                value = values[slot]
+                if type(value) is float:
+                    values[slot] = value + step
+                else:
+                    self.execute(increment)
+            finally:
+                self.environment = previous
+
+    def counter_loop(self, stmt):
+        return counter_loop(stmt)
 
     def visit_assign_expr(self, expr):
         value = self.evaluate(expr.value)
 
-        if expr in self.locals:
-            distance = self.locals[expr]
-            self.environment.assign_at(distance, expr.name, value)
+        if expr.depth is None:
+            self.globals.assign(expr.name, expr.slot, value)
         else:
-            self.globals.assign(expr.name, value)
+            self.environment.assign_at(expr.depth, expr.slot, value)
+
+        return value
+
+    def visit_increment_assign_expr(self, expr):
+        operand = expr.value
+        value = operand.operation(operand.operator, self.lookup_variable(operand.left.name, operand.left),
+                                  operand.right.value)
+
+        if expr.depth is None:
+            self.globals.assign(expr.name, expr.slot, value)
+        else:
+            self.environment.assign_at(expr.depth, expr.slot, value)
 
         return value
 
@@ -136,48 +316,56 @@ class Interpreter(ExprVisitor, StmtVisitor):
                 self.execute(statement)
         except RuntimeException as exc:
             self.error_handler(exc)
+        except RecursionError as exc:
+            self.error_handler(stack_overflow(exc))
 
     def visit_binary_expr(self, expr):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
+        value = expr.operation(expr.operator, left, right)
+        quicken(expr, left, right)
+        return value
+
+    def visit_variable_literal_binary_expr(self, expr):
+        return expr.operation(expr.operator, self.lookup_variable(expr.left.name, expr.left), expr.right.value)
+
+    def visit_generic_binary_expr(self, expr):
+        return expr.operation(expr.operator, self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def visit_number_binary_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return expr.compute(left, right)
+
+        deoptimize(expr)
+        return expr.operation(expr.operator, left, right)
+
+    def visit_string_binary_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+
+        if type(left) is str and type(right) is str:
+            return expr.compute(left, right)
 
-        match expr.operator.token_type:
-            case TokenType.GREATER:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) > float(right)
-            case TokenType.GREATER_EQUAL:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) >= float(right)
-            case TokenType.LESS:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) < float(right)
-            case TokenType.LESS_EQUAL:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) <= float(right)
-            case TokenType.MINUS:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) - float(right)
-            case TokenType.PLUS:
-                if isinstance(left, float) and isinstance(right, float):
-                    return float(left) + float(right)
-
-                if isinstance(left, str) and isinstance(right, str):
-                    return str(left) + str(right)
-
-                raise RuntimeException(expr.operator, "Operands must be two numbers or two strings")
-            case TokenType.SLASH:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) / float(right)
-            case TokenType.STAR:
-                self.check_number_operands(expr.operator, left, right)
-                return float(left) * float(right)
-            case TokenType.BANG_EQUAL:
-                return not self.is_equal(left, right)
-            case TokenType.EQUAL_EQUAL:
-                return self.is_equal(left, right)
+        deoptimize(expr)
+        return expr.operation(expr.operator, left, right)
 
     def visit_call_expr(self, expr):
-        callee = self.evaluate(expr.callee)
+        # A method that is called right away is never bound
+        if type(expr.callee) is Get:
+            object = self.evaluate(expr.callee.object)
+            entry = self.find_property(expr.callee, object)
+
+            if type(entry) is not int:
+                return self.call_method(expr, entry, object)
+
+            callee = object.values[entry]
+        elif type(expr.callee) is Super:
+            return self.call_method(expr, *self.find_super_method(expr.callee))
+        else:
+            callee = self.evaluate(expr.callee)
 
         arguments = []
         for argument in expr.arguments:
@@ -192,8 +380,41 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if len(arguments) != callee.arity():
             raise RuntimeException(expr.paren, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
 
+        if expr.tail and type(callee) is LoxFunction:
+            return self.defer_call(callee, callee.instance, arguments)
+
         return callee.call(self, arguments)
 
+    def visit_this_call_expr(self, expr):
+        object = self.environment.get_at(expr.callee.object.depth, expr.callee.object.slot)
+        entry = self.find_property(expr.callee, object)
+
+        if type(entry) is not int:
+            return self.call_method(expr, entry, object)
+
+        # A function stored in a field
+        return self.visit_call_expr(expr)
+
+    def call_method(self, expr, method, instance):
+        arguments = []
+        for argument in expr.arguments:
+            arguments.append(self.evaluate(argument))
+
+        if len(arguments) != method.arity():
+            raise RuntimeException(expr.paren, f"Expected {method.arity()} arguments but got {len(arguments)}.")
+
+        if expr.tail:
+            return self.defer_call(method, instance, arguments)
+
+        return method.call_method(self, instance, arguments)
+
+    def defer_call(self, function, instance, arguments):
+        """
+        Leaves a call in tail position to LoxFunction.call_method of the frame returning it
+        """
+        self.tail_call = (function, instance, arguments)
+        return TAIL_CALL
+
     def visit_literal_expr(self, expr):
         return expr.value
 
@@ -216,21 +437,34 @@ class Interpreter(ExprVisitor, StmtVisitor):
             raise RuntimeException(expr.name, "Only instances have fields.")
 
         value = self.evaluate(expr.value)
-        object.set(expr.name, value)
+
+        shape = object.shape
+        cache = expr.cache
+        entry = cache.entry if shape is cache.shape else cache.set(shape, expr.name.lexeme)
+
+        if type(entry) is int:
+            object.values[entry] = value
+        else:
+            object.shape = entry
+            object.values.append(value)
 
         return value
     
     def visit_super_expr(self, expr):
-        distance = self.locals[expr]
-        super_class = self.environment.get_at(distance, "super")
-        object = self.environment.get_at(distance - 1, "this")
+        method, object = self.find_super_method(expr)
+        return self.bind_method(method, object)
+
+    def find_super_method(self, expr):
+        super_class = self.environment.get_at(expr.depth, expr.slot)
+        # 'this' is the first slot of the method frame just inside 'super'
+        object = self.environment.get_at(expr.depth - 1, 0)
 
         method = super_class.find_method(expr.method.lexeme)
 
         if not method:
             raise RuntimeException(expr.method, f"Undefined property {expr.method.lexeme}.")
 
-        return method.bind(object)
+        return method, object
 
     def visit_this_expr(self, expr):
         return self.lookup_variable(expr.keyword, expr)
@@ -239,37 +473,21 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self.evaluate(expr.expression)
 
     def visit_unary_expr(self, expr):
-        right = self.evaluate(expr.right)
-
-        match expr.operator.token_type:
-            case TokenType.BANG:
-                return not self.is_truthy(right)
-            case TokenType.MINUS:
-                self.check_number_operand(expr.operator, right)
-                return -float(right)
+        return expr.operation(expr.operator, self.evaluate(expr.right))
 
     def visit_variable_expr(self, expr):
         return self.lookup_variable(expr.name, expr)
 
     def lookup_variable(self, name: Token, expr: Expr):
-        if expr in self.locals:
-            distance = self.locals[expr]
-            return self.environment.get_at(distance, name.lexeme)
-
-        return self.globals.get(name)
-
-
-    def check_number_operand(self, operator, operand):
-        if isinstance(operand, float):
-            return
+        if expr.depth is None:
+            value = self.globals.values[expr.slot]
+            if value is UNDEFINED:
+                return self.globals.get(name, expr.slot)
 
-        raise RuntimeException(operator, "Operand must be a number")
+            return value
 
-    def check_number_operands(self, operator, left, right):
-        if isinstance(left, float) and isinstance(right, float):
-            return
+        return self.environment.get_at(expr.depth, expr.slot)
 
-        raise RuntimeException(operator, "Operands must be numbers")
 
     def is_truthy(self, object):
         if object is None:
@@ -280,15 +498,6 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         return True
 
-    def is_equal(self, a, b):
-        if a is None and b is None:
-            return True
-
-        if a is None:
-            return False
-
-        return a == b
-
     def stringify(self, object):
         if object is None:
             return "nil"
@@ -1,26 +1,80 @@
+import gc
+import marshal
+import pickle
 from pathlib import Path
 
-from lox.scanner import Scanner
+from lox.scanner import FastScanner
 from lox.token import Token
 from lox.token_type import TokenType
-from lox.parser import Parser
+from lox.parser import Parser, StreamingParser
 from lox.interpreter import Interpreter
+from lox.closure_compiler import ClosureInterpreter
+from lox.instrumented import CountingInterpreter
 from lox.resolver import Resolver
+from lox.optimizer import Optimizer, Inliner
+from lox.fusion import Fuser
+from lox.compiler import Compiler
+from lox.vm import VM, MAX_DEPTH
+from lox.transpiler import Transpiler, execute
+from lox.exception import RuntimeException
+from lox import cache
+from lox import python_runtime
+
+ENGINES = ("interpreter", "closure", "vm", "python")
+
+# Characters read from a script at a time
+CHUNK_SIZE = 1 << 16
+
+
+def read_chunks(path):
+    with open(path) as file:
+        yield from iter(lambda: file.read(CHUNK_SIZE), "")
 
 
 class Lox:
     had_error = False
     had_runtime_error = False
     interpreter = None
+    vm = None
+    namespace = None
+    engine = "interpreter"
+    # Optimization level, 0 runs the program as parsed, 1 folds constants and 2 also inlines functions
+    optimization = 0
+    # Deepest nesting of Lox calls on the vm, whose frames are not on the Python stack
+    max_depth = MAX_DEPTH
+    # Profiler sampling the program while it executes, if any
+    profiler = None
+    # Whether the interpreter counts node evaluations, calls and allocations
+    counting = False
 
     @classmethod
     def get_interpreter(cls):
         if cls.interpreter is None:
-            cls.interpreter = Interpreter(cls.runtime_error)
+            if cls.engine == "closure":
+                cls.interpreter = ClosureInterpreter(cls.runtime_error)
+            elif cls.counting:
+                cls.interpreter = CountingInterpreter(cls.runtime_error)
+            else:
+                cls.interpreter = Interpreter(cls.runtime_error)
         return cls.interpreter
 
+    @classmethod
+    def get_vm(cls):
+        if cls.vm is None:
+            cls.vm = VM(cls.runtime_error, cls.max_depth)
+        return cls.vm
+
+    @classmethod
+    def get_namespace(cls):
+        if cls.namespace is None:
+            cls.namespace = python_runtime.namespace()
+        return cls.namespace
+
     @staticmethod
     def run_prompt():
+        # A later line may declare a function again, so none of them is inlined
+        Lox.optimization = min(Lox.optimization, 1)
+
         while True:
             print('>', end = ' ')
             line = input()
@@ -32,33 +86,235 @@ class Lox:
             Lox.had_error = False
 
     @staticmethod
-    def run(source):
-        scanner = Scanner(source, Lox.line_error)
-        tokens = scanner.scan_tokens()
-        parser = Parser(tokens, Lox.token_error)
-        statements = parser.parse()
+    def run(source, path=None):
+        if Lox.engine == "python":
+            Lox.run_python(source, path)
+            return
+
+        Lox.run_statements(Lox.parse(Lox.scan(source)))
+
+    @staticmethod
+    def parse_chunks(chunks):
+        """
+        Scans and parses the source while it is being read, so neither the
+        whole text nor its token list is ever held in memory
+        """
+        scanner = FastScanner("", Lox.line_error)
+        parser = StreamingParser(scanner.iter_tokens(chunks), Lox.token_error)
+        return parser.parse()
+
+    @staticmethod
+    def run_statements(statements):
+        if Lox.had_error:
+            return
 
+        statements = Lox.optimize(statements)
+        backend = Lox.resolve(statements)
+
+        # Stop if there was a resolution
         if Lox.had_error:
             return
 
+        Lox.execute(backend, statements)
+
+    @staticmethod
+    def scan(source):
+        scanner = FastScanner(source, Lox.line_error)
+        return scanner.scan_tokens()
+
+    @staticmethod
+    def parse(tokens):
+        parser = Parser(tokens, Lox.token_error)
+        return parser.parse()
+
+    @staticmethod
+    def get_backend():
+        """
+        Object that executes resolved statements for the current engine
+        """
+        if Lox.engine == "vm":
+            return Compiler()
+
+        if Lox.engine == "python":
+            return Transpiler()
+
         # In a REPL every time the interpreter object will be intialized, deleting the environment,
         # which is wrong
         # interpreter = Interpreter(Lox.runtime_error)
-        interpreter = Lox.get_interpreter()
+        return Lox.get_interpreter()
+
+    @staticmethod
+    def get_globals():
+        """
+        Global table the Resolver interns global names into, only the tree walkers have one
+        """
+        if Lox.engine in ("vm", "python"):
+            return None
+
+        return Lox.get_interpreter().globals
 
-        resolver = Resolver(interpreter, Lox.token_error)
+    @staticmethod
+    def optimize(statements):
+        if Lox.optimization == 0:
+            return statements
+
+        return Optimizer().optimize(statements)
+
+    @staticmethod
+    def resolve(statements):
+        """
+        Resolves the statements for the current engine and returns the object that executes them
+        """
+        backend = Lox.get_backend()
+        resolver = Resolver(Lox.token_error, Lox.get_globals())
         resolver.resolve_statements(statements)
 
-        # Stop if there was a resolution
-        if Lox.had_error:
+        if Lox.optimization >= 2 and not Lox.had_error:
+            Inliner().inline(statements)
+
+        # Fused nodes skip evaluating the nodes below them, which counting has to see
+        if Lox.engine == "interpreter" and Lox.optimization >= 1 and not Lox.counting and not Lox.had_error:
+            Fuser().fuse(statements)
+
+        return backend
+
+    @staticmethod
+    def execute(backend, statements):
+        if Lox.profiler:
+            Lox.profiler.start()
+
+        try:
+            if Lox.engine == "vm":
+                Lox.get_vm().interpret(backend.compile(statements))
+            elif Lox.engine == "python":
+                Lox.run_code(backend.compile(statements))
+            else:
+                backend.interpret(statements)
+        finally:
+            if Lox.profiler:
+                Lox.profiler.stop()
+
+    @staticmethod
+    def run_python(source, path=None):
+        key = cache.source_hash(source, f"code-O{Lox.optimization}")
+        cached = cache.load(path, "code", key) if path else None
+
+        if cached is not None:
+            code = marshal.loads(cached)
+        else:
+            statements = Lox.parse(Lox.scan(source))
+
+            if Lox.had_error:
+                return
+
+            statements = Lox.optimize(statements)
+            transpiler = Lox.resolve(statements)
+
+            if Lox.had_error:
+                return
+
+            try:
+                code = transpiler.compile(statements)
+            except (SyntaxError, RecursionError):
+                # Nested deeper than Python's parser or compiler allow, the
+                # interpreter runs the program instead, and everything after it
+                Lox.engine = "interpreter"
+                Lox.run(source, path)
+                return
+
+            # Only programs without static errors get here, so a cache hit never needs to report any
+            if path:
+                cache.store(path, "code", key, marshal.dumps(code))
+
+        Lox.run_code(code)
+
+    @staticmethod
+    def run_script(path):
+        """
+        Runs a script on the tree walkers or the vm, loading its resolved AST
+        from the cache when the source did not change since it was stored
+        """
+        # Counted programs are stored apart, as they are not fused
+        kind = f"{Lox.engine}.counting.ast" if Lox.counting else f"{Lox.engine}.ast"
+        version = f"ast-O{Lox.optimization}"
+        cached = cache.load(path, kind, cache.source_hash(read_chunks(path), version))
+        statements = Lox.load_program(cached) if cached is not None else None
+
+        if statements is None:
+            # Hashed as it is parsed, so the program is stored under the key
+            # of the text it came from even if the file changed since
+            digest = cache.source_digest(version)
+            statements = Lox.parse_chunks(cache.hashed(read_chunks(path), digest))
+
+            if Lox.had_error:
+                return
+
+            statements = Lox.optimize(statements)
+            backend = Lox.resolve(statements)
+
+            if Lox.had_error:
+                return
+
+            # Stored before executing, which fills the inline caches of the nodes
+            Lox.store_program(path, kind, digest.digest(), statements)
+        else:
+            backend = Lox.get_backend()
+
+        Lox.execute(backend, statements)
+
+    @staticmethod
+    def store_program(path, kind: str, key: bytes, statements):
+        globals = Lox.get_globals()
+        names = list(globals.slots) if globals else None
+
+        # Pickling allocates objects for every node, which would keep triggering full collections
+        gc.disable()
+        try:
+            data = pickle.dumps((names, statements), pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
             return
+        finally:
+            gc.enable()
 
-        interpreter.interpret(statements)
+        cache.store(path, kind, key, data)
+
+    @staticmethod
+    def load_program(data: bytes):
+        """
+        Statements of a cached program, or None if they cannot be used
+        """
+        gc.disable()
+        try:
+            names, statements = pickle.loads(data)
+        except Exception:
+            # Written by a version whose node classes no longer load
+            return None
+        finally:
+            gc.enable()
+
+        # Global slots in the nodes are only valid for a table interned in the same order
+        globals = Lox.get_globals()
+        if globals is not None:
+            for slot, name in enumerate(names):
+                if globals.intern(name) != slot:
+                    return None
+
+        return statements
+
+    @staticmethod
+    def run_code(code):
+        try:
+            execute(code, Lox.get_namespace())
+        except RuntimeException as exc:
+            Lox.runtime_error(exc)
 
     @staticmethod
     def run_file(path):
-        source = Path(path).read_text()
-        Lox.run(source)
+        if Lox.engine == "python":
+            # The code cache is keyed by a hash of the whole source
+            Lox.run(Path(path).read_text(), path)
+        else:
+            Lox.run_script(path)
 
         if Lox.had_error:
             exit(65)
@@ -1,34 +1,32 @@
 from lox.lox_callable import LoxCallable
 from lox.lox_instance import LoxInstance
+from lox.shape import Shape
 
 class LoxClass(LoxCallable):
     def __init__(self, name, super_class, methods):
         self.name = name
         self.super_class = super_class
-        self.methods = methods
+        # Inherited methods are copied down so a lookup is a single probe
+        self.methods = dict(super_class.methods) if super_class else {}
+        self.methods.update(methods)
+        self.initializer = self.methods.get("init")
+        self.initializer_arity = self.initializer.arity() if self.initializer else 0
+        # Shape of instances without fields
+        self.shape = Shape(self, {})
     
     def find_method(self, name):
-        if name in self.methods:
-            return self.methods[name]
-    
-        if self.super_class:
-            return self.super_class.find_method(name)
+        return self.methods.get(name)
 
     def call(self, interpreter, arguments):
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
         
-        if initializer:
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer:
+            self.initializer.call_method(interpreter, instance, arguments)
 
         return instance
 
     def arity(self):
-        initializer = self.find_method("init")
-        if not initializer:
-            return 0
-        
-        return initializer.arity()
+        return self.initializer_arity
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
@@ -1,37 +1,65 @@
 from lox.lox_callable import LoxCallable
-from lox.environment import Environment
-from lox.exception import Return
+from lox.environment import LocalEnvironment
+
+# Completion of a statement that executed 'return'. Statements complete with
+# None otherwise, and the returned value is left in interpreter.return_value
+RETURNED = object()
+
+# Value returned by a call in tail position, which is left in
+# interpreter.tail_call for the frame being returned from to make
+TAIL_CALL = object()
 
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration, closure, is_initializer: bool):
+    def __init__(self, declaration, closure, is_initializer: bool, instance=None):
         self.closure = closure
         self.declaration = declaration
         self.is_initializer = is_initializer
+        # Receiver of a bound method
+        self.instance = instance
     
     def bind(self, instance):
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.is_initializer)
+        return LoxFunction(self.declaration, self.closure, self.is_initializer, instance)
 
     def arity(self):
         return len(self.declaration.params)
 
     def call(self, interpreter, arguments):
-        environment = Environment(self.closure)
-
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, arguments[i])
-
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except Return as return_value:
-            if self.is_initializer:
-                return self.closure.get_at(0, "this")
-            
-            return return_value.value
-        
-        if self.is_initializer:
-            return self.closure.get_at(0, "this")
+        return self.call_method(interpreter, self.instance, arguments)
+
+    def call_method(self, interpreter, instance, arguments):
+        """
+        Calls the method on instance without binding it first, or the function
+        if instance is None. Tail calls made by the body run in this loop, so
+        they take no Python stack.
+        """
+        function = self
+
+        while True:
+            declaration = function.declaration
+            environment = LocalEnvironment(function.closure, declaration.size)
+            values = environment.values
+
+            if instance is None:
+                # Parameters take the first slots of the frame
+                values[:len(arguments)] = arguments
+            else:
+                # 'this' takes the first slot, followed by the parameters
+                values[0] = instance
+                values[1:len(arguments) + 1] = arguments
+
+            completion = interpreter.execute_block(declaration.body, environment)
+
+            if function.is_initializer:
+                return instance
+
+            if completion is not RETURNED:
+                return None
+
+            value = interpreter.return_value
+            if value is not TAIL_CALL:
+                return value
+
+            function, instance, arguments = interpreter.tail_call
 
     def __str__(self):
         return f"<fn {self.declaration.name.lexeme}>"
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Implementations of the binary and unary operators, each checking its operand
+types and computing the result in one function. The Resolver stores the one
+for a node's operator in it, so evaluating the node needs no dispatch on the
+token type.
+
+Engines that check for number operands themselves compute the result with
+the Python operator in NUMBER_BINARY or NUMBER_UNARY, and leave any other
+operands to the function in BINARY or UNARY. The operators in EXACT_BINARY
+compute the same result as BINARY for operands of any type.
+"""
+import operator
+
+from lox.token import Token
+from lox.token_type import TokenType
+from lox.exception import RuntimeException
+
+
+def greater(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left > right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def greater_equal(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left >= right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def less(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left < right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def less_equal(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left <= right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def subtract(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left - right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def add(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left + right
+    if type(left) is str and type(right) is str:
+        return left + right
+    raise RuntimeException(operator, "Operands must be two numbers or two strings")
+
+
+def divide(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left / right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def multiply(operator: Token, left, right):
+    if type(left) is float and type(right) is float:
+        return left * right
+    raise RuntimeException(operator, "Operands must be numbers")
+
+
+def not_equal(operator: Token, left, right):
+    if left is None:
+        return right is not None
+    return not left == right
+
+
+def equal(operator: Token, left, right):
+    if left is None:
+        return right is None
+    return left == right
+
+
+def negate(operator: Token, right):
+    if type(right) is float:
+        return -right
+    raise RuntimeException(operator, "Operand must be a number")
+
+
+def logical_not(operator: Token, right):
+    return right is None or right is False
+
+
+BINARY = {
+    TokenType.GREATER: greater,
+    TokenType.GREATER_EQUAL: greater_equal,
+    TokenType.LESS: less,
+    TokenType.LESS_EQUAL: less_equal,
+    TokenType.MINUS: subtract,
+    TokenType.PLUS: add,
+    TokenType.SLASH: divide,
+    TokenType.STAR: multiply,
+    TokenType.BANG_EQUAL: not_equal,
+    TokenType.EQUAL_EQUAL: equal,
+}
+
+UNARY = {
+    TokenType.MINUS: negate,
+    TokenType.BANG: logical_not,
+}
+
+NUMBER_BINARY = {
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.MINUS: operator.sub,
+    TokenType.PLUS: operator.add,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+}
+
+EXACT_BINARY = {
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.EQUAL_EQUAL: operator.eq,
+}
+
+NUMBER_UNARY = {
+    TokenType.MINUS: operator.neg,
+}
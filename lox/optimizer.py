@@ -0,0 +1,369 @@
+"""
+Optimization passes over the parsed program.
+
+The Optimizer runs before the Resolver. Expressions whose operands are all
+literals are folded into a literal, and statements guarded by a constant
+condition are pruned. Anything that would raise at runtime, like "a" - 1, is
+left in place to raise with its line.
+
+The Inliner runs on the resolved program and replaces calls to small global
+functions by their body.
+"""
+import copy
+
+from lox.expr import ExprVisitor, Expr, Assign, Binary, Call, Get, Grouping, Literal, Logical, Unary, Variable, This, Super
+from lox.stmt import StmtVisitor, Stmt, Block, Return, Var, Function, Class
+from lox.token_type import TokenType
+from lox.shape import InlineCache
+from lox.operators import BINARY, UNARY
+from lox.exception import RuntimeException
+
+# Nodes the Resolver may report an error at, which must survive pruning
+CHECKED_NODES = (Return, Var, Function, Class, This, Super, Variable)
+
+# Result of folding an operation that has to be left to the runtime
+NOT_CONSTANT = object()
+
+# Nodes a function returns an expression of to be inlined, none of them has side effects
+PURE_NODES = (Binary, Get, Grouping, Literal, Logical, Unary, Variable)
+
+# Arguments that can be read any number of times, in any order, without raising
+TRIVIAL_NODES = (Literal, This)
+
+# Largest number of nodes in the returned expression of an inlined function
+INLINE_LIMIT = 16
+
+
+def is_truthy(value) -> bool:
+    if value is None:
+        return False
+
+    if isinstance(value, bool):
+        return value
+
+    return True
+
+
+def fold(operation, operator, *operands):
+    """
+    Value of an operation on literals, computed by the same function the runtime uses
+    """
+    try:
+        return operation(operator, *operands)
+    except (RuntimeException, ZeroDivisionError):
+        # Left to raise at runtime
+        return NOT_CONSTANT
+
+
+def fields(node):
+    """
+    Names of the fields of node, which are declared by its generated class
+    even when the node was quickened or fused into a subclass
+    """
+    for klass in type(node).__mro__:
+        if klass.__slots__:
+            return klass.__slots__
+
+    return ()
+
+
+def children(node):
+    """
+    Expressions and statements directly below node
+    """
+    for name in fields(node):
+        value = getattr(node, name)
+
+        if isinstance(value, (Expr, Stmt)):
+            yield value
+        elif isinstance(value, list):
+            yield from (item for item in value if isinstance(item, (Expr, Stmt)))
+
+
+def is_checked(node) -> bool:
+    """
+    Whether the Resolver could reject anything in node
+    """
+    if isinstance(node, CHECKED_NODES):
+        return True
+
+    return any(is_checked(child) for child in children(node))
+
+
+class Optimizer(ExprVisitor, StmtVisitor):
+    def optimize(self, statements):
+        optimized = []
+
+        for statement in statements:
+            statement = statement.accept(self)
+            if statement is not None:
+                optimized.append(statement)
+
+        return optimized
+
+    def optimize_expr(self, expr):
+        return expr.accept(self)
+
+    def optimize_branch(self, stmt):
+        """
+        Statement in a place that needs one, even if it was optimized away
+        """
+        stmt = stmt.accept(self)
+        return Block([]) if stmt is None else stmt
+
+    def prune(self, live, dead):
+        """
+        Replaces a statement by its live part, unless its dead part has to be resolved
+        """
+        if dead is not None and is_checked(dead):
+            return NOT_CONSTANT
+
+        return live
+
+    def visit_assign_expr(self, expr):
+        expr.value = self.optimize_expr(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr):
+        expr.left = self.optimize_expr(expr.left)
+        expr.right = self.optimize_expr(expr.right)
+
+        if type(expr.left) is Literal and type(expr.right) is Literal:
+            value = fold(BINARY[expr.operator.token_type], expr.operator, expr.left.value, expr.right.value)
+            if value is not NOT_CONSTANT:
+                return Literal(value)
+
+        return expr
+
+    def visit_call_expr(self, expr):
+        expr.callee = self.optimize_expr(expr.callee)
+        expr.arguments = [self.optimize_expr(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr):
+        expr.object = self.optimize_expr(expr.object)
+        return expr
+
+    def visit_grouping_expr(self, expr):
+        return self.optimize_expr(expr.expression)
+
+    def visit_literal_expr(self, expr):
+        return expr
+
+    def visit_logical_expr(self, expr):
+        expr.left = self.optimize_expr(expr.left)
+        expr.right = self.optimize_expr(expr.right)
+
+        if type(expr.left) is Literal:
+            # The left operand decides whether the right one is the result
+            short_circuits = is_truthy(expr.left.value) == (expr.operator.token_type == TokenType.OR)
+            if not short_circuits:
+                return expr.right
+            if not is_checked(expr.right):
+                return expr.left
+
+        return expr
+
+    def visit_set_expr(self, expr):
+        expr.object = self.optimize_expr(expr.object)
+        expr.value = self.optimize_expr(expr.value)
+        return expr
+
+    def visit_super_expr(self, expr):
+        return expr
+
+    def visit_this_expr(self, expr):
+        return expr
+
+    def visit_unary_expr(self, expr):
+        expr.right = self.optimize_expr(expr.right)
+
+        if type(expr.right) is Literal:
+            value = fold(UNARY[expr.operator.token_type], expr.operator, expr.right.value)
+            if value is not NOT_CONSTANT:
+                return Literal(value)
+
+        return expr
+
+    def visit_variable_expr(self, expr):
+        return expr
+
+    def visit_block_stmt(self, stmt):
+        stmt.statements = self.optimize(stmt.statements)
+        return stmt
+
+    def visit_class_stmt(self, stmt):
+        for method in stmt.methods:
+            self.visit_function_stmt(method)
+
+        return stmt
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression = self.optimize_expr(stmt.expression)
+
+        # A literal on its own has no effect
+        if type(stmt.expression) is Literal:
+            return None
+
+        return stmt
+
+    def visit_function_stmt(self, stmt):
+        stmt.body = self.optimize(stmt.body)
+        return stmt
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition = self.optimize_expr(stmt.condition)
+        stmt.then_branch = self.optimize_branch(stmt.then_branch)
+
+        if stmt.else_branch:
+            stmt.else_branch = stmt.else_branch.accept(self)
+
+        if type(stmt.condition) is Literal:
+            if is_truthy(stmt.condition.value):
+                live = self.prune(stmt.then_branch, stmt.else_branch)
+            else:
+                live = self.prune(stmt.else_branch, stmt.then_branch)
+
+            if live is not NOT_CONSTANT:
+                return live
+
+        return stmt
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression = self.optimize_expr(stmt.expression)
+        return stmt
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value:
+            stmt.value = self.optimize_expr(stmt.value)
+
+        return stmt
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer:
+            stmt.initializer = self.optimize_expr(stmt.initializer)
+
+        return stmt
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition = self.optimize_expr(stmt.condition)
+        stmt.body = self.optimize_branch(stmt.body)
+
+        if type(stmt.condition) is Literal and not is_truthy(stmt.condition.value):
+            live = self.prune(None, stmt.body)
+            if live is not NOT_CONSTANT:
+                return live
+
+        return stmt
+
+
+def size(node) -> int:
+    return 1 + sum(size(child) for child in children(node))
+
+
+def is_pure(node) -> bool:
+    return type(node) in PURE_NODES and all(is_pure(child) for child in children(node))
+
+
+def is_trivial(argument) -> bool:
+    # Locals cannot be undefined and are out of reach of a pure body
+    return type(argument) in TRIVIAL_NODES or (type(argument) is Variable and argument.depth is not None)
+
+
+def inline_body(function: Function):
+    """
+    Expression a global function returns, if calls to it can be replaced by it
+    """
+    if function.depth is not None or len(function.body) != 1:
+        return None
+
+    statement = function.body[0]
+
+    if type(statement) is not Return or statement.value is None:
+        return None
+
+    # A pure body makes no calls, so the function cannot be recursive either
+    if not is_pure(statement.value) or size(statement.value) > INLINE_LIMIT:
+        return None
+
+    return statement.value
+
+
+def substitute(node, arguments):
+    """
+    Copy of an inlined body, with the parameters replaced by the arguments
+    """
+    # Without nested scopes, depth zero is the function's own frame of parameters
+    if type(node) is Variable and node.depth == 0:
+        return copy.copy(arguments[node.slot])
+
+    node = copy.copy(node)
+
+    for name in fields(node):
+        value = getattr(node, name)
+        if isinstance(value, Expr):
+            setattr(node, name, substitute(value, arguments))
+
+    if type(node) is Get:
+        node.cache = InlineCache()
+
+    return node
+
+
+class Inliner:
+    """
+    Replaces calls to global functions that just return a small pure
+    expression by that expression. Only functions declared once and never
+    assigned to are inlined, and only at calls after their declaration, so
+    the callee is known to be defined. Arguments must be literals or locals,
+    whose evaluation neither raises nor depends on when it happens.
+    """
+
+    def inline(self, statements):
+        declared = {}
+        assigned = set()
+
+        for statement in statements:
+            if type(statement) in (Var, Function, Class):
+                declared[statement.name.lexeme] = declared.get(statement.name.lexeme, 0) + 1
+
+        self.collect_assigned(statements, assigned)
+
+        self.functions = {}
+
+        for statement in statements:
+            self.rewrite(statement)
+
+            if type(statement) is Function:
+                name = statement.name.lexeme
+                body = inline_body(statement)
+                if body is not None and declared[name] == 1 and name not in assigned:
+                    self.functions[name] = statement
+
+    def collect_assigned(self, nodes, assigned: set):
+        for node in nodes:
+            if type(node) is Assign and node.depth is None:
+                assigned.add(node.name.lexeme)
+
+            self.collect_assigned(children(node), assigned)
+
+    def rewrite(self, node):
+        for name in fields(node):
+            value = getattr(node, name)
+
+            if isinstance(value, (Expr, Stmt)):
+                setattr(node, name, self.rewrite_child(value))
+            elif isinstance(value, list):
+                value[:] = [self.rewrite_child(item) if isinstance(item, (Expr, Stmt)) else item for item in value]
+
+    def rewrite_child(self, node):
+        self.rewrite(node)
+
+        if type(node) is Call and type(node.callee) is Variable and node.callee.depth is None:
+            function = self.functions.get(node.callee.name.lexeme)
+
+            if (function is not None and len(node.arguments) == len(function.params)
+                    and all(is_trivial(argument) for argument in node.arguments)):
+                return substitute(function.body[0].value, node.arguments)
+
+        return node
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterable, List
 
 from lox.token import Token
 from lox.token_type import TokenType
@@ -443,3 +443,29 @@ class Parser:
                 return
 
         self.advance()
+
+
+class StreamingParser(Parser):
+    """
+    Parser pulling tokens from an iterator, so only the next token and the
+    last consumed one are kept instead of the whole token list.
+    """
+
+    def __init__(self, tokens: Iterable[Token], error_handler):
+        super().__init__([], error_handler)
+        self.stream = iter(tokens)
+        self.next = next(self.stream)
+        self.last = None
+
+    def advance(self):
+        if self.next.token_type != TokenType.EOF:
+            self.last = self.next
+            self.next = next(self.stream)
+
+        return self.last
+
+    def peek(self):
+        return self.next
+
+    def previous(self):
+        return self.last
@@ -0,0 +1,210 @@
+"""
+Sampling profiler for Lox programs, enabled by --profile.
+
+A timer signal interrupts the program about every INTERVAL seconds of CPU
+time and the handler records the Lox call stack that was running, rebuilt
+from the Python frames: on the tree-walking engines every
+LoxFunction.call_method frame is the call of a Lox function, as is a call site
+closure of the closure engine running a function's body, and the vm keeps its
+own frames in VM.run. The line is taken from the token of the innermost
+node being evaluated. Nothing is recorded, or costs anything, while the
+profiler is not running.
+
+The timer ticks no faster than the kernel's clock, so every sample is weighed
+by the CPU time measured since the previous one rather than by INTERVAL.
+"""
+import signal
+import types
+from collections import Counter
+from time import process_time
+
+from lox.expr import Expr
+from lox.stmt import Stmt
+from lox.token import Token
+from lox.interpreter import Interpreter
+from lox.closure_compiler import ClosureInterpreter, ClosureCompiler
+from lox.lox_function import LoxFunction
+from lox.vm import VM
+
+# Seconds of CPU time between samples asked of the timer
+INTERVAL = 0.001
+
+# Name of the frame of the top level code
+SCRIPT = "<script>"
+
+# Fields of the nodes that hold the token their line is reported at
+TOKEN_FIELDS = ("operator", "paren", "name", "keyword", "method")
+
+CALL_METHOD = LoxFunction.call_method.__code__
+
+VM_RUN = VM.run.__code__
+
+# Frames below which no Lox code runs
+INTERPRET = {Interpreter.interpret.__code__, ClosureInterpreter.interpret.__code__}
+
+
+def nested_codes(code):
+    yield code
+
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            yield from nested_codes(constant)
+
+
+# Closures of the closure engine's call sites, which run the body of a plain
+# Lox function in their own frame once they made its environment
+DIRECT_CALLS = {
+    code for code in nested_codes(ClosureCompiler.visit_call_expr.__code__) if code.co_name == "call"
+}
+
+# Code of the visitors and compiled closures that evaluate nodes, the only
+# frames whose locals are read to find the line
+NODE_CODES = {
+    nested
+    for klass in (Interpreter, ClosureInterpreter, ClosureCompiler)
+    for value in vars(klass).values() if isinstance(value, types.FunctionType)
+    for nested in nested_codes(value.__code__)
+}
+
+
+def node_line(node):
+    for name in TOKEN_FIELDS:
+        token = getattr(node, name, None)
+        if type(token) is Token:
+            return token.line
+
+    return None
+
+
+def frame_line(frame):
+    """
+    Line of the node a Python frame of the interpreter or of a compiled closure works on
+    """
+    for value in frame.f_locals.values():
+        if type(value) is Token:
+            return value.line
+
+        if isinstance(value, (Expr, Stmt)):
+            line = node_line(value)
+            if line is not None:
+                return line
+
+    return None
+
+
+def vm_stack(names: dict):
+    """
+    Lox call stack and line of a VM.run frame, from its local variables
+    """
+    closures = [frame[0] for frame in names["frames"]] + [names["closure"]]
+    stack = tuple(closure.function.name or SCRIPT for closure in closures)
+
+    ip = names["ip"]
+    token = names["tokens"][ip - 1] if ip > 0 else None
+
+    return stack, token.line if token else None
+
+
+def lox_stack(frame):
+    """
+    Lox call stack, outermost first, and line that the Python frame is running
+    """
+    functions = []
+    line = None
+
+    while frame is not None:
+        code = frame.f_code
+
+        if code is VM_RUN:
+            return vm_stack(frame.f_locals)
+
+        if code in INTERPRET:
+            break
+
+        if code is CALL_METHOD:
+            # Tail calls replace the function being run in the same frame
+            names = frame.f_locals
+            function = names.get("function", names["self"])
+            functions.append(function.declaration.name.lexeme)
+        elif code in DIRECT_CALLS and "environment" in (names := frame.f_locals):
+            functions.append(names["function"].declaration.name.lexeme)
+        elif line is None and not functions and code in NODE_CODES:
+            line = frame_line(frame)
+
+        frame = frame.f_back
+
+    functions.append(SCRIPT)
+    return tuple(reversed(functions)), line
+
+
+class Profiler:
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        # Seconds of CPU time spent in every call stack, and on every line
+        self.stacks = Counter()
+        self.lines = Counter()
+        self.last = 0.0
+
+    def start(self):
+        self.last = process_time()
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def sample(self, signum, frame):
+        now = process_time()
+        elapsed = now - self.last
+        self.last = now
+
+        stack, line = lox_stack(frame)
+        self.samples += 1
+        self.stacks[stack] += elapsed
+
+        if line is not None:
+            self.lines[line] += elapsed
+
+    def functions(self):
+        """
+        CPU time of every function while it ran itself, and while it was on the stack
+        """
+        own = Counter()
+        total = Counter()
+
+        for stack, seconds in self.stacks.items():
+            own[stack[-1]] += seconds
+            # Recursive calls count once
+            for name in set(stack):
+                total[name] += seconds
+
+        return own, total
+
+    def report(self, file, limit: int = 20):
+        seconds = sum(self.stacks.values())
+        print(f"{self.samples} samples, {seconds * 1000:.1f} ms of CPU time", file=file)
+
+        if not seconds:
+            return
+
+        own, total = self.functions()
+
+        print(f"\n{'self ms':>10} {'self %':>7} {'total ms':>10} {'total %':>7}  function", file=file)
+        for name in sorted(total, key=lambda name: (own[name], total[name]), reverse=True)[:limit]:
+            print(f"{own[name] * 1000:10.1f} {own[name] / seconds:7.1%} "
+                  f"{total[name] * 1000:10.1f} {total[name] / seconds:7.1%}  {name}", file=file)
+
+        print(f"\n{'self ms':>10} {'self %':>7}  line", file=file)
+        for line, time in self.lines.most_common(limit):
+            print(f"{time * 1000:10.1f} {time / seconds:7.1%}  {line}", file=file)
+
+    def write_collapsed(self, path: str):
+        """
+        Writes the samples in the collapsed stack format read by flamegraph
+        tools, weighed in microseconds of CPU time
+        """
+        with open(path, "w") as file:
+            for stack, seconds in sorted(self.stacks.items()):
+                file.write(f"{';'.join(stack)} {round(seconds * 1e6)}\n")
@@ -0,0 +1,225 @@
+"""
+Runtime support for Python code generated by lox.transpiler.
+
+Lox functions are plain Python functions and Lox classes are Python classes
+deriving from LoxObject, so only the operations whose semantics differ from
+Python's live here.
+"""
+import time
+from keyword import iskeyword
+from types import FunctionType, MethodType
+
+from lox.token import Token
+from lox.token_type import TokenType
+from lox.exception import RuntimeException
+
+
+class LoxObject:
+    """
+    Base class of every class declared in Lox. Fields live in the instance
+    __dict__ and therefore shadow methods, like in the tree walker.
+    """
+
+
+class Native:
+    def __init__(self, arity: int, function):
+        self.arity = arity
+        self.function = function
+
+    def __str__(self):
+        return "<native fn>"
+
+
+def error(message: str, line: int):
+    return RuntimeException(Token(TokenType.EOF, "", None, line), message)
+
+
+def lox_name(name: str) -> str:
+    """
+    Source name of a generated global, local or function name
+    """
+    return name.split("_", 1)[1]
+
+
+def property_name(name: str) -> str:
+    """
+    Python attribute for a Lox property, kept clear of Python's dunder names and keywords
+    """
+    return "_l" + name if name.startswith("_") or iskeyword(name) else name
+
+
+def source_property_name(name: str) -> str:
+    return name[2:] if name.startswith("_l") else name
+
+
+def stringify(value):
+    if value is None:
+        return "nil"
+
+    kind = type(value)
+
+    if kind is float:
+        text = str(value)
+
+        if text[-2:] == ".0":
+            text = text[:len(text) - 2]
+
+        return text
+
+    if kind is FunctionType:
+        return f"<fn {lox_name(value.__name__)}>"
+
+    if kind is MethodType:
+        return f"<fn {lox_name(value.__func__.__name__)}>"
+
+    if isinstance(value, LoxObject):
+        return kind.__name__ + " instance"
+
+    if isinstance(value, type):
+        return value.__name__
+
+    return str(value)
+
+
+def arity_of(callee):
+    kind = type(callee)
+
+    if kind is FunctionType:
+        return callee.__code__.co_argcount
+
+    if kind is MethodType:
+        return callee.__func__.__code__.co_argcount - 1
+
+    if kind is Native:
+        return callee.arity
+
+    if isinstance(callee, type) and issubclass(callee, LoxObject):
+        initializer = callee._methods.get("init")
+        if initializer is None:
+            return 0
+        return initializer.__code__.co_argcount - 1
+
+    return None
+
+
+def call(callee, line: int, *arguments):
+    arity = arity_of(callee)
+
+    if arity is None:
+        raise error("Can only call functions and classes.", line)
+
+    if len(arguments) != arity:
+        raise error(f"Expected {arity} arguments but got {len(arguments)}.", line)
+
+    if type(callee) is Native:
+        return callee.function(*arguments)
+
+    if isinstance(callee, type):
+        instance = callee()
+        initializer = callee._methods.get("init")
+        if initializer is not None:
+            initializer(instance, *arguments)
+        return instance
+
+    return callee(*arguments)
+
+
+def superclass(value, line: int):
+    if not (isinstance(value, type) and issubclass(value, LoxObject)):
+        raise error("Superclass must be a class.", line)
+
+    return value
+
+
+def make_class(name: str, super_class, methods: dict):
+    klass = type(name, (super_class or LoxObject, ), {})
+
+    # Flattened table used for 'super' lookups and initializers
+    klass._methods = dict(super_class._methods) if super_class else {}
+    klass._methods.update(methods)
+
+    for method_name, method in methods.items():
+        setattr(klass, method_name, method)
+
+    return klass
+
+
+def super_method(super_class, name: str, instance, line: int):
+    method = super_class._methods.get(name)
+
+    if method is None:
+        raise error(f"Undefined property {source_property_name(name)}.", line)
+
+    return MethodType(method, instance)
+
+
+def set_property(instance, name: str, value):
+    setattr(instance, name, value)
+    return value
+
+
+def store(cell: list, value):
+    cell[0] = value
+    return value
+
+
+def assign_global(namespace: dict, name: str, value, line: int):
+    if name not in namespace:
+        raise error(f"Undefined variable '{lox_name(name)}'.", line)
+
+    namespace[name] = value
+    return value
+
+
+def undefined_variable(name: str, line: int):
+    raise error(f"Undefined variable '{lox_name(name)}'.", line)
+
+
+def numbers_expected(line: int):
+    raise error("Operands must be numbers", line)
+
+
+def number_expected(line: int):
+    raise error("Operand must be a number", line)
+
+
+def numbers_or_strings_expected(line: int):
+    raise error("Operands must be two numbers or two strings", line)
+
+
+def no_properties(line: int):
+    raise error("Only instances have properties.", line)
+
+
+def no_fields(line: int):
+    raise error("Only instances have fields.", line)
+
+
+def namespace() -> dict:
+    """
+    Fresh globals for executing generated code
+    """
+    globals = {
+        "_F": float,
+        "_S": str,
+        "_FN": FunctionType,
+        "_M": MethodType,
+        "_Obj": LoxObject,
+        "_str": stringify,
+        "_call": call,
+        "_superclass": superclass,
+        "_class": make_class,
+        "_super": super_method,
+        "_set": set_property,
+        "_store": store,
+        "_assign": assign_global,
+        "_undefined": undefined_variable,
+        "_numbers": numbers_expected,
+        "_number": number_expected,
+        "_plus": numbers_or_strings_expected,
+        "_no_properties": no_properties,
+        "_no_fields": no_fields,
+        "G_clock": Native(0, time.time),
+    }
+    globals["_G"] = globals
+    return globals
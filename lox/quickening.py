@@ -0,0 +1,71 @@
+"""
+Quickening of Binary nodes by the Interpreter.
+
+The first time a Binary node is evaluated it rewrites itself, by changing its
+class, to one specialized for the types of operands it saw: two numbers, or
+two strings for '+'. The specialized node computes its result with a single
+guard on the operand types. When the guard fails it deoptimizes for good to
+the generic node, which evaluates the operator like Interpreter.visit_binary_expr
+does, errors included.
+"""
+import operator
+
+from lox.expr import Binary
+from lox.token_type import TokenType
+from lox.operators import NUMBER_BINARY
+
+
+class GenericBinary(Binary):
+    """
+    Binary node that saw operands of changing types and is not quickened again
+    """
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_generic_binary_expr(self)
+
+
+class NumberBinary(Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_binary_expr(self)
+
+
+class StringBinary(Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_string_binary_expr(self)
+
+
+def specialize(base, compute):
+    """
+    Node class computing its result by compute once the guard of base passed
+    """
+    return type(f"{base.__name__}_{compute.__name__}", (base, ), {"__slots__": (), "compute": staticmethod(compute)})
+
+
+NUMBER_NODES = {token_type: specialize(NumberBinary, compute) for token_type, compute in NUMBER_BINARY.items()}
+
+STRING_NODES = {
+    TokenType.PLUS: specialize(StringBinary, operator.add),
+}
+
+
+def quicken(expr: Binary, left, right):
+    """
+    Specializes expr for the operands it was just evaluated with
+    """
+    if type(left) is float and type(right) is float:
+        node = NUMBER_NODES.get(expr.operator.token_type, GenericBinary)
+    elif type(left) is str and type(right) is str:
+        node = STRING_NODES.get(expr.operator.token_type, GenericBinary)
+    else:
+        node = GenericBinary
+
+    expr.__class__ = node
+
+
+def deoptimize(expr: Binary):
+    expr.__class__ = GenericBinary
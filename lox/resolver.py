@@ -1,8 +1,12 @@
+from __future__ import annotations
+
 from enum import Enum
 
-from lox.expr import ExprVisitor
-from lox.stmt import StmtVisitor
+from lox.expr import ExprVisitor, Call
+from lox.stmt import StmtVisitor, Block
 from lox.token import Token
+from lox.shape import InlineCache
+from lox.operators import BINARY, UNARY
 
 
 class FunctionType(Enum):
@@ -19,24 +23,29 @@ class ClassType(Enum):
 
 
 class Resolver(ExprVisitor, StmtVisitor):
-    def __init__(self, interpreter, error_handler):
-        self.interpreter = interpreter
+    def __init__(self, error_handler, globals=None):
+        # Global table that global names are interned into, if the backend has one
+        self.globals = globals
         self.scopes = []
+        # Index of every local within its environment, parallel to scopes
+        self.slots = []
         self.stack = []
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
         self.error_handler = error_handler
+        # Functions and methods resolved so far, each of them a closure at runtime
+        self.functions = 0
 
     def visit_block_stmt(self, stmt):
         self.begin_scope()
         self.resolve_statements(stmt.statements)
-        self.end_scope()
+        stmt.size = self.end_scope()
     
     def visit_class_stmt(self, stmt):
         enclosing_class = self.current_class
         self.current_class = ClassType.CLASS
 
-        self.declare(stmt.name)
+        self.declare_statement(stmt)
         self.define(stmt.name)
 
         if stmt.super_class and stmt.name.lexeme == stmt.super_class.name.lexeme:
@@ -48,10 +57,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         
         if stmt.super_class:
             self.begin_scope()
-            self.scopes[-1]["super"] = True
-
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
+            self.define_slot("super")
 
         for method in stmt.methods:
             declaration = FunctionType.METHOD
@@ -59,8 +65,6 @@ class Resolver(ExprVisitor, StmtVisitor):
                 declaration = FunctionType.INITIALIZER
 
             self.resolve_function(method, declaration)
-        
-        self.end_scope()
 
         if stmt.super_class:
             self.end_scope()
@@ -69,6 +73,7 @@ class Resolver(ExprVisitor, StmtVisitor):
     
     def visit_get_expr(self, expr):
         self.resolve_expr(expr.object)
+        expr.cache = InlineCache()
 
     def visit_expression_stmt(self, stmt):
         self.resolve_expr(stmt.expression)
@@ -91,14 +96,24 @@ class Resolver(ExprVisitor, StmtVisitor):
             if self.current_function == FunctionType.INITIALIZER:
                 self.error_handler(stmt.keyword, "Can't return a value from an initializer.")
 
+            # The frame is done once the call is made, so the callee can run in its place
+            if type(stmt.value) is Call:
+                stmt.value.tail = True
+
             self.resolve_expr(stmt.value)
 
     def visit_while_stmt(self, stmt):
         self.resolve_expr(stmt.condition)
-        self.resolve_statements(stmt.body)
+
+        functions = self.functions
+        self.resolve_stmt(stmt.body)
+
+        # Without closures made in the body nothing outlives an iteration
+        # that could see its block's environment, so one can serve them all
+        stmt.reuse_scope = type(stmt.body) is Block and self.functions == functions
 
     def visit_var_stmt(self, stmt):
-        self.declare(stmt.name)
+        self.declare_statement(stmt)
 
         if stmt.initializer:
             self.resolve_expr(stmt.initializer)
@@ -110,6 +125,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve_local(expr, expr.name)
 
     def visit_binary_expr(self, expr):
+        expr.operation = BINARY[expr.operator.token_type]
         self.resolve_expr(expr.left)
         self.resolve_expr(expr.right)
 
@@ -132,6 +148,7 @@ class Resolver(ExprVisitor, StmtVisitor):
     def visit_set_expr(self, expr):
         self.resolve_expr(expr.value)
         self.resolve_expr(expr.object)
+        expr.cache = InlineCache()
     
     def visit_super_expr(self, expr):
         if self.current_class == ClassType.NONE:
@@ -147,10 +164,11 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve_local(expr, expr.keyword)
 
     def visit_unary_expr(self, expr):
+        expr.operation = UNARY[expr.operator.token_type]
         self.resolve_expr(expr.right)
 
     def visit_function_stmt(self, stmt):
-        self.declare(stmt.name)
+        self.declare_statement(stmt)
         self.define(stmt.name)
 
         self.resolve_function(stmt, FunctionType.FUNCTION)
@@ -172,35 +190,60 @@ class Resolver(ExprVisitor, StmtVisitor):
         expr.accept(self)
 
     def resolve_function(self, function, function_type):
+        self.functions += 1
         enclosing_function = self.current_function
         self.current_function = function_type
 
         self.begin_scope()
 
+        # Methods get 'this' in the first slot of their own frame, so calling
+        # one needs no separate environment for the receiver
+        if function_type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            self.define_slot("this")
+
         for param in function.params:
             self.declare(param)
             self.define(param)
 
         self.resolve_statements(function.body)
-        self.end_scope()
+        # The frame is allocated at its full size when the function is called
+        function.size = self.end_scope()
 
         self.current_function = enclosing_function
 
     def begin_scope(self):
         self.scopes.append({})
+        self.slots.append({})
 
-    def end_scope(self):
+    def end_scope(self) -> int:
         self.scopes.pop()
+        return len(self.slots.pop())
 
-    def declare(self, name):
+    def declare(self, name) -> int | None:
         if not self.scopes:
-            return
+            return None
 
         scope = self.scopes[-1]
         if name.lexeme in scope:
             self.error_handler(name, "Already variable with this name in this scope.")
 
         self.scopes[-1][name.lexeme] = False
+        return self.slots[-1].setdefault(name.lexeme, len(self.slots[-1]))
+
+    def declare_statement(self, stmt):
+        slot = self.declare(stmt.name)
+
+        if slot is None:
+            stmt.slot = self.global_slot(stmt.name)
+        else:
+            stmt.depth = 0
+            stmt.slot = slot
+
+    def global_slot(self, name: Token) -> int | None:
+        if self.globals is None:
+            return None
+
+        return self.globals.intern(name.lexeme)
 
     def define(self, name: Token):
         if not self.scopes:
@@ -208,9 +251,17 @@ class Resolver(ExprVisitor, StmtVisitor):
 
         self.scopes[-1][name.lexeme] = True
 
+    def define_slot(self, name: str):
+        self.scopes[-1][name] = True
+        self.slots[-1][name] = len(self.slots[-1])
+
     def resolve_local(self, expr, name):
         scope_length = len(self.scopes)
         for i in range(scope_length - 1, -1, -1):
             if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(expr, scope_length - 1 - i)
-                return
\ No newline at end of file
+                expr.depth = scope_length - 1 - i
+                expr.slot = self.slots[i][name.lexeme]
+                return
+
+        # Globals keep depth None and use their slot in the global table
+        expr.slot = self.global_slot(name)
\ No newline at end of file
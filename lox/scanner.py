@@ -1,3 +1,7 @@
+import re
+from sys import intern
+from typing import Iterable, Iterator
+
 from lox.token_type import TokenType
 from lox.token import Token
 
@@ -21,6 +25,38 @@ KEYWORDS = {
     "while"  : TokenType.WHILE
 }
 
+OPERATORS = {
+    "("  : TokenType.LEFT_PAREN,
+    ")"  : TokenType.RIGHT_PAREN,
+    "{"  : TokenType.LEFT_BRACE,
+    "}"  : TokenType.RIGHT_BRACE,
+    ","  : TokenType.COMMA,
+    "."  : TokenType.DOT,
+    "-"  : TokenType.MINUS,
+    "+"  : TokenType.PLUS,
+    ";"  : TokenType.SEMICOLON,
+    "/"  : TokenType.SLASH,
+    "*"  : TokenType.STAR,
+    "!"  : TokenType.BANG,
+    "!=" : TokenType.BANG_EQUAL,
+    "="  : TokenType.EQUAL,
+    "==" : TokenType.EQUAL_EQUAL,
+    ">"  : TokenType.GREATER,
+    ">=" : TokenType.GREATER_EQUAL,
+    "<"  : TokenType.LESS,
+    "<=" : TokenType.LESS_EQUAL,
+}
+
+# One lexeme per match, after skipping blanks. Newlines are matched together
+# with the blank lines that follow, and the final alternative takes any single
+# character nothing else accepts, so only trailing blanks are left unmatched
+LEXEME = re.compile(r'[ \r\t]*(\n[ \r\t\n]*|//[^\n]*|[A-Za-z_][A-Za-z0-9_]*|[0-9]+(?:\.[0-9]+)?|"[^"]*"?|[!=<>]=?|[^ \r\t])')
+
+# Lexemes that always have the same token type
+FIXED_LEXEMES = {**OPERATORS, **KEYWORDS}
+
+IDENTIFIER_START = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+DIGITS = frozenset("0123456789")
 
 class Scanner:
     def __init__(self, source, error_handler):
@@ -102,9 +138,9 @@ class Scanner:
         while self.is_alpha_numeric(self.peek()):
             self.advance()
 
-        text = self.source[self.start:self.current]
+        text = intern(self.source[self.start:self.current])
         type = KEYWORDS.get(text, TokenType.IDENTIFIER)
-        self.add_token(type)
+        self.tokens.append(Token(type, text, None, self.line))
 
     def string(self):
         while self.peek() != '"' and not self.is_at_end():
@@ -187,3 +223,75 @@ class Scanner:
 
     def is_at_end(self):
         return self.current >= len(self.source)
+
+
+class FastScanner(Scanner):
+    """
+    Scanner consuming a whole lexeme per regex match instead of one character
+    at a time. Produces the same tokens and errors as Scanner.
+    """
+
+    def scan_tokens(self):
+        self.tokens.extend(self.iter_tokens((self.source, )))
+        return self.tokens
+
+    def iter_tokens(self, chunks: Iterable[str]) -> Iterator[Token]:
+        """
+        Yields the tokens of the source arriving in chunks, as soon as the
+        lexemes they come from are complete. Only the text after the last
+        newline of a chunk, or a string that is still open, is held back.
+        """
+        self.line = 1
+        pending = ""
+
+        for chunk in chunks:
+            pending += chunk
+            end = pending.rfind("\n") + 1
+
+            if end:
+                rest = yield from self.lexemes(pending[:end], False)
+                pending = rest + pending[end:]
+
+        yield from self.lexemes(pending, True)
+        yield Token(TokenType.EOF, "", None, self.line)
+
+    def lexemes(self, source: str, final: bool):
+        """
+        Yields the tokens of source and returns the open string it ends with,
+        unless it is the final piece of the source
+        """
+        line = self.line
+
+        for text in LEXEME.findall(source):
+            token_type = FIXED_LEXEMES.get(text)
+            if token_type is not None:
+                yield Token(token_type, intern(text), None, line)
+                continue
+
+            first = text[0]
+
+            if first in IDENTIFIER_START:
+                # Every occurrence of a name shares one string
+                yield Token(TokenType.IDENTIFIER, intern(text), None, line)
+            elif first == "\n":
+                line += text.count("\n")
+            elif first in DIGITS:
+                yield Token(TokenType.NUMBER, text, float(text), line)
+            elif first == '"':
+                closed = len(text) > 1 and text[-1] == '"'
+                if not (closed or final):
+                    # The closing quote may be in the next chunk
+                    self.line = line
+                    return text
+
+                # A string is reported on the line it ends on
+                line += text.count("\n")
+                if closed:
+                    yield Token(TokenType.STRING, text, text[1:-1], line)
+                else:
+                    self.error_handler(line, "Unterminated string.")
+            elif first != "/":
+                self.error_handler(line, "Unexpected Character.")
+
+        self.line = line
+        return ""
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+# Shapes an inline cache remembers besides its first one before it stops caching
+POLYMORPHIC_LIMIT = 4
+
+
+class Shape:
+    """
+    Layout shared by the instances of a class that got the same fields in the
+    same order. Adding a field moves an instance to the next shape, which is
+    created once and then shared through the transitions table.
+    """
+    __slots__ = ("klass", "slots", "transitions")
+
+    def __init__(self, klass, slots: dict):
+        self.klass = klass
+        self.slots = slots
+        self.transitions = {}
+
+    def add(self, name: str) -> Shape:
+        shape = self.transitions.get(name)
+
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = self.transitions[name] = Shape(self.klass, slots)
+
+        return shape
+
+
+class InlineCache:
+    """
+    Result of a property lookup at one Get or Set node, keyed by the shape of
+    the instance. The first shape seen is checked directly, a few more are kept
+    in a dict and any shape beyond those is looked up every time.
+    """
+    __slots__ = ("shape", "entry", "entries")
+
+    def __init__(self):
+        self.shape = None
+        self.entry = None
+        self.entries = {}
+
+    def store(self, shape: Shape, entry):
+        if self.shape is None:
+            self.shape = shape
+            self.entry = entry
+        elif len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries[shape] = entry
+
+    def get(self, shape: Shape, name: str):
+        """
+        Slot of the field to read, else the method to bind, else None
+        """
+        entry = self.entries.get(shape)
+
+        if entry is None:
+            entry = shape.slots.get(name)
+            if entry is None:
+                entry = shape.klass.find_method(name)
+            self.store(shape, entry)
+
+        return entry
+
+    def set(self, shape: Shape, name: str):
+        """
+        Slot of the field to write, or the shape the instance moves to when the field is new
+        """
+        entry = self.entries.get(shape)
+
+        if entry is None:
+            entry = shape.slots.get(name)
+            if entry is None:
+                entry = shape.add(name)
+            self.store(shape, entry)
+
+        return entry
@@ -46,27 +46,40 @@ class StmtVisitor(ABC):
 
 
 class Stmt(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor: StmtVisitor):
         pass
 
 class Block(Stmt):
+    __slots__ = ("statements", "size")
+
     def __init__(self, statements: List[Stmt]):
         self.statements = statements
+        # Filled in by the resolver
+        self.size = None
 
     def accept(self, visitor: StmtVisitor):
         return visitor.visit_block_stmt(self)
 
 class Class(Stmt):
+    __slots__ = ("name", "super_class", "methods", "depth", "slot")
+
     def __init__(self, name: Token, super_class: Variable, methods: List[Function]):
         self.name = name
         self.super_class = super_class
         self.methods = methods
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor: StmtVisitor):
         return visitor.visit_class_stmt(self)
 
 class Expression(Stmt):
+    __slots__ = ("expression", )
+
     def __init__(self, expression: Expr):
         self.expression = expression
 
@@ -74,15 +87,23 @@ class Expression(Stmt):
         return visitor.visit_expression_stmt(self)
 
 class Function(Stmt):
+    __slots__ = ("name", "params", "body", "depth", "slot", "size")
+
     def __init__(self, name: Token, params: List[Token], body: List[Stmt]):
         self.name = name
         self.params = params
         self.body = body
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
+        self.size = None
 
     def accept(self, visitor: StmtVisitor):
         return visitor.visit_function_stmt(self)
 
 class If(Stmt):
+    __slots__ = ("condition", "then_branch", "else_branch")
+
     def __init__(self, condition: Expr, then_branch: Stmt, else_branch: Stmt):
         self.condition = condition
         self.then_branch = then_branch
@@ -92,6 +113,8 @@ class If(Stmt):
         return visitor.visit_if_stmt(self)
 
 class Print(Stmt):
+    __slots__ = ("expression", )
+
     def __init__(self, expression: Expr):
         self.expression = expression
 
@@ -99,6 +122,8 @@ class Print(Stmt):
         return visitor.visit_print_stmt(self)
 
 class Return(Stmt):
+    __slots__ = ("keyword", "value")
+
     def __init__(self, keyword: Token, value: Expr):
         self.keyword = keyword
         self.value = value
@@ -107,17 +132,26 @@ class Return(Stmt):
         return visitor.visit_return_stmt(self)
 
 class Var(Stmt):
+    __slots__ = ("name", "initializer", "depth", "slot")
+
     def __init__(self, name: Token, initializer: Expr):
         self.name = name
         self.initializer = initializer
+        # Filled in by the resolver
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor: StmtVisitor):
         return visitor.visit_var_stmt(self)
 
 class While(Stmt):
+    __slots__ = ("condition", "body", "reuse_scope")
+
     def __init__(self, condition: Expr, body: Stmt):
         self.condition = condition
         self.body = body
+        # Filled in by the resolver
+        self.reuse_scope = None
 
     def accept(self, visitor: StmtVisitor):
         return visitor.visit_while_stmt(self)
@@ -1,6 +1,8 @@
 from lox.token_type import TokenType
 
 class Token:
+    __slots__ = ("token_type", "lexeme", "literal", "line")
+
     def __init__(self, token_type: TokenType, lexeme: str, literal: object, line: int):
         self.token_type = token_type
         self.lexeme = lexeme
@@ -0,0 +1,694 @@
+from __future__ import annotations
+
+import ast
+from types import CodeType
+
+from lox.expr import ExprVisitor, Expr, Binary, Logical, Unary, Literal, Grouping
+from lox.stmt import StmtVisitor, If
+from lox.token_type import TokenType
+from lox.python_runtime import property_name, source_property_name, lox_name, error
+
+
+INDENTATION = "    "
+
+ARITHMETIC = {
+    TokenType.MINUS         : "-",
+    TokenType.SLASH         : "/",
+    TokenType.STAR          : "*",
+    TokenType.GREATER       : ">",
+    TokenType.GREATER_EQUAL : ">=",
+    TokenType.LESS          : "<",
+    TokenType.LESS_EQUAL    : "<=",
+}
+
+# Operators whose result is always a bool, so Python truthiness can be used directly
+BOOLEAN_OPERATORS = {
+    TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL, TokenType.GREATER, TokenType.GREATER_EQUAL,
+    TokenType.LESS, TokenType.LESS_EQUAL, TokenType.BANG,
+}
+
+# Operations of a chain nested in each other before the transpiler evaluates one into a temporary
+CHAIN_DEPTH = 16
+
+# Prefixes of the placeholder names patched with real names and Lox line numbers
+GLOBAL_MARKER = "_lox_global_"
+PROPERTY_MARKER = "_lox_property_"
+CALL_MARKER = "_lox_call_"
+
+
+class Binding:
+    """
+    A local variable of the Lox program
+    """
+    def __init__(self, name: str, kind: str, owner: FunctionInfo, index: int):
+        self.name = name
+        self.kind = kind
+        self.owner = owner
+        self.index = index
+        self.captured = False
+        self.assigned = False
+
+    @property
+    def boxed(self) -> bool:
+        # Captured variables that can change after the closure was created live in a
+        # one element list, the rest is captured by value
+        return self.captured and (self.assigned or self.kind in ("function", "class"))
+
+    @property
+    def python_name(self) -> str:
+        if self.kind == "this":
+            return "this"
+        if self.kind == "super":
+            return f"S{self.index}"
+        if self.boxed:
+            return f"C{self.index}_{self.name}"
+        return f"L{self.index}_{self.name}"
+
+
+class FunctionInfo:
+    def __init__(self, parent: FunctionInfo | None):
+        self.parent = parent
+        # Bindings of enclosing functions used here or in nested functions
+        self.free = []
+        self.assigned_globals = set()
+        self.temps = 0
+
+
+class Analyzer(ExprVisitor, StmtVisitor):
+    """
+    Maps every variable reference to its declaration, mirroring the scopes of
+    the Resolver so its depths can be used directly, and finds the variables
+    captured by closures.
+    """
+
+    def __init__(self):
+        self.scopes = []
+        self.bindings = {}
+        self.references = {}
+        self.functions = {}
+        self.function = FunctionInfo(None)
+        self.count = 0
+
+    def analyze(self, statements) -> FunctionInfo:
+        for statement in statements:
+            statement.accept(self)
+        return self.function
+
+    def declare(self, key, name: str, kind: str) -> Binding | None:
+        if not self.scopes:
+            self.function.assigned_globals.add(name)
+            return None
+
+        self.count += 1
+        binding = Binding(name, kind, self.function, self.count)
+        self.scopes[-1][name] = binding
+        self.bindings[key] = binding
+        return binding
+
+    def reference(self, expr: Expr, name: str, assigned: bool = False):
+        if expr.depth is None:
+            if assigned:
+                self.function.assigned_globals.add(name)
+            self.references[expr] = None
+            return
+
+        binding = self.scopes[len(self.scopes) - 1 - expr.depth][name]
+        self.references[expr] = binding
+
+        if assigned:
+            binding.assigned = True
+
+        self.capture(binding, binding.owner)
+
+    def capture(self, binding: Binding, owner: FunctionInfo):
+        function = self.function
+        while function is not owner:
+            binding.captured = True
+            if binding not in function.free:
+                function.free.append(binding)
+            function = function.parent
+
+    def resolve_function(self, stmt, is_method: bool):
+        function = FunctionInfo(self.function)
+        self.functions[stmt] = function
+        self.function = function
+
+        self.scopes.append({})
+        if is_method:
+            self.declare((stmt, "this"), "this", "this")
+
+        for param in stmt.params:
+            self.declare(param, param.lexeme, "parameter")
+
+        for statement in stmt.body:
+            statement.accept(self)
+
+        self.scopes.pop()
+        self.function = function.parent
+
+    def visit_block_stmt(self, stmt):
+        self.scopes.append({})
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt):
+        if stmt.super_class:
+            stmt.super_class.accept(self)
+
+        self.declare(stmt, stmt.name.lexeme, "class")
+
+        if stmt.super_class:
+            self.scopes.append({})
+            self.declare((stmt, "super"), "super", "super")
+
+        for method in stmt.methods:
+            self.resolve_function(method, True)
+
+        if stmt.super_class:
+            self.scopes.pop()
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_function_stmt(self, stmt):
+        self.declare(stmt, stmt.name.lexeme, "function")
+        self.resolve_function(stmt, False)
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch:
+            stmt.else_branch.accept(self)
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        self.declare(stmt, stmt.name.lexeme, "variable")
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visit_assign_expr(self, expr):
+        expr.value.accept(self)
+        self.reference(expr, expr.name.lexeme, True)
+
+    def visit_binary_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_call_expr(self, expr):
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_get_expr(self, expr):
+        expr.object.accept(self)
+
+    def visit_grouping_expr(self, expr):
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        pass
+
+    def visit_logical_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_set_expr(self, expr):
+        expr.object.accept(self)
+        expr.value.accept(self)
+
+    def visit_super_expr(self, expr):
+        self.reference(expr, "super")
+        # The receiver is the 'this' of the method frame just inside 'super'
+        this = self.scopes[len(self.scopes) - expr.depth]["this"]
+        self.capture(this, this.owner)
+
+    def visit_this_expr(self, expr):
+        self.reference(expr, "this")
+
+    def visit_unary_expr(self, expr):
+        expr.right.accept(self)
+
+    def visit_variable_expr(self, expr):
+        self.reference(expr, expr.name.lexeme)
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    """
+    Emits Python source for a resolved Lox program and compiles it.
+
+    Lox functions become Python functions whose captured variables are passed
+    as keyword-only defaults, so every execution of a declaration gets its own
+    binding like an Environment would. Global reads and property loads, the
+    only operations left to fail inside Python itself, are emitted as markers
+    that get their Lox line numbers once the source is parsed.
+    """
+
+    FILENAME = "<lox>"
+
+    def __init__(self):
+        self.markers = []
+        self.lines = []
+        self.depth = 0
+        self.analyzer = None
+        self.function = None
+        self.initializer = False
+        self.methods = 0
+
+    def compile(self, statements) -> CodeType:
+        tree = ast.parse(self.transpile(statements), self.FILENAME)
+        tree = ast.fix_missing_locations(MarkerTransformer(self.markers).visit(tree))
+        return compile(tree, self.FILENAME, "exec")
+
+    def transpile(self, statements) -> str:
+        self.analyzer = Analyzer()
+        self.function = self.analyzer.analyze(statements)
+
+        # Top level code runs inside a function so block scoped variables are fast locals
+        self.emit("def _main():")
+        self.depth += 1
+        self.emit_globals(self.function)
+        self.emit_statements(statements)
+        self.depth -= 1
+        self.emit("_main()")
+
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, line: str):
+        self.lines.append(INDENTATION * self.depth + line)
+
+    def emit_statements(self, statements):
+        start = len(self.lines)
+        for statement in statements:
+            statement.accept(self)
+
+        if len(self.lines) == start:
+            self.emit("pass")
+
+    def emit_suite(self, stmt):
+        self.depth += 1
+        self.emit_statements([stmt])
+        self.depth -= 1
+
+    def emit_globals(self, function: FunctionInfo):
+        if function.assigned_globals:
+            self.emit("global " + ", ".join(sorted(f"G_{name}" for name in function.assigned_globals)))
+
+    def temp(self) -> str:
+        self.function.temps += 1
+        return f"_t{self.function.temps}"
+
+    def expr(self, expr: Expr) -> str:
+        return expr.accept(self)
+
+    def marker(self, prefix: str, name: str, line: int) -> str:
+        self.markers.append((name, line))
+        return f"{prefix}{len(self.markers) - 1}"
+
+    def condition(self, expr: Expr) -> str:
+        code = self.expr(expr)
+
+        if self.is_boolean(expr):
+            return code
+
+        value = self.temp()
+        return f"({value} := {code}) is not None and {value} is not False"
+
+    def is_boolean(self, expr: Expr) -> bool:
+        if isinstance(expr, Grouping):
+            return self.is_boolean(expr.expression)
+        if isinstance(expr, Literal):
+            return isinstance(expr.value, bool)
+        if isinstance(expr, (Binary, Unary)):
+            return expr.operator.token_type in BOOLEAN_OPERATORS
+        return False
+
+    def load(self, binding: Binding) -> str:
+        if binding.boxed:
+            return f"{binding.python_name}[0]"
+        return binding.python_name
+
+    def declare(self, binding: Binding | None, name: str, value: str):
+        if binding is None:
+            self.emit(f"G_{name} = {value}")
+        elif binding.boxed:
+            self.emit(f"{binding.python_name} = [{value}]")
+        else:
+            self.emit(f"{binding.python_name} = {value}")
+
+    def store(self, binding: Binding | None, name: str, value: str):
+        if binding is not None and binding.boxed:
+            self.emit(f"{binding.python_name}[0] = {value}")
+        else:
+            self.declare(binding, name, value)
+
+    def emit_function(self, stmt, name: str, is_method: bool):
+        enclosing, enclosing_initializer = self.function, self.initializer
+        self.function = self.analyzer.functions[stmt]
+        self.initializer = is_method and stmt.name.lexeme == "init"
+
+        parameters = ["this"] if is_method else []
+        boxed = []
+        for param in stmt.params:
+            binding = self.analyzer.bindings[param]
+            parameters.append(f"L{binding.index}_{binding.name}")
+            if binding.boxed:
+                boxed.append(binding)
+
+        if self.function.free:
+            parameters.append("*")
+            parameters.extend(f"{binding.python_name}={binding.python_name}" for binding in self.function.free)
+
+        self.emit(f"def {name}({', '.join(parameters)}):")
+        self.depth += 1
+        self.emit_globals(self.function)
+        for binding in boxed:
+            self.emit(f"{binding.python_name} = [L{binding.index}_{binding.name}]")
+        self.emit_statements(stmt.body)
+        if self.initializer:
+            self.emit("return this")
+        self.depth -= 1
+
+        self.function, self.initializer = enclosing, enclosing_initializer
+
+    def visit_block_stmt(self, stmt):
+        # Every binding has a unique name, so blocks need no scope of their own
+        for statement in stmt.statements:
+            statement.accept(self)
+
+    def visit_class_stmt(self, stmt):
+        binding = self.analyzer.bindings.get(stmt)
+        super_class = "None"
+
+        if stmt.super_class:
+            super_class = self.analyzer.bindings[(stmt, "super")].python_name
+            self.emit(f"{super_class} = _superclass({self.expr(stmt.super_class)}, {stmt.super_class.name.line})")
+
+        self.declare(binding, stmt.name.lexeme, "None")
+
+        methods = []
+        for method in stmt.methods:
+            self.methods += 1
+            function_name = f"M{self.methods}_{method.name.lexeme}"
+            self.emit_function(method, function_name, True)
+            methods.append(f"{property_name(method.name.lexeme)!r}: {function_name}")
+
+        self.store(binding, stmt.name.lexeme,
+                   f"_class({stmt.name.lexeme!r}, {super_class}, {{{', '.join(methods)}}})")
+
+    def visit_expression_stmt(self, stmt):
+        expression = stmt.expression
+        kind = type(expression).__name__
+
+        if kind == "Assign":
+            binding = self.analyzer.references[expression]
+            value = self.expr(expression.value)
+
+            if binding is not None:
+                self.store(binding, expression.name.lexeme, value)
+                return
+
+            temp = self.temp()
+            self.emit(f"{temp} = {value}")
+            self.emit(f"if 'G_{expression.name.lexeme}' not in _G: "
+                      f"_undefined('G_{expression.name.lexeme}', {expression.name.line})")
+            self.emit(f"G_{expression.name.lexeme} = {temp}")
+            return
+
+        if kind == "Set":
+            attribute = property_name(expression.name.lexeme)
+
+            if type(expression.object).__name__ == "This":
+                self.emit(f"this.{attribute} = {self.expr(expression.value)}")
+                return
+
+            instance = self.temp()
+            self.emit(f"{instance} = {self.expr(expression.object)}")
+            self.emit(f"if not isinstance({instance}, _Obj): _no_fields({expression.name.line})")
+            self.emit(f"{instance}.{attribute} = {self.expr(expression.value)}")
+            return
+
+        self.emit(self.expr(expression))
+
+    def visit_function_stmt(self, stmt):
+        binding = self.analyzer.bindings.get(stmt)
+
+        if binding is None:
+            self.emit_function(stmt, f"G_{stmt.name.lexeme}", False)
+        elif binding.boxed:
+            # The cell exists before the function so its body can capture it
+            self.declare(binding, stmt.name.lexeme, "None")
+            self.emit_function(stmt, f"F{binding.index}_{binding.name}", False)
+            self.store(binding, stmt.name.lexeme, f"F{binding.index}_{binding.name}")
+        else:
+            self.emit_function(stmt, binding.python_name, False)
+
+    def visit_if_stmt(self, stmt):
+        self.emit(f"if {self.condition(stmt.condition)}:")
+        self.emit_suite(stmt.then_branch)
+
+        # Else-if chains stay at one level, Python limits how deeply suites nest
+        while type(stmt.else_branch) is If:
+            stmt = stmt.else_branch
+            self.emit(f"elif {self.condition(stmt.condition)}:")
+            self.emit_suite(stmt.then_branch)
+
+        if stmt.else_branch:
+            self.emit("else:")
+            self.emit_suite(stmt.else_branch)
+
+    def visit_print_stmt(self, stmt):
+        self.emit(f"print(_str({self.expr(stmt.expression)}))")
+
+    def visit_return_stmt(self, stmt):
+        if self.initializer:
+            self.emit("return this")
+        elif stmt.value:
+            self.emit(f"return {self.expr(stmt.value)}")
+        else:
+            self.emit("return None")
+
+    def visit_var_stmt(self, stmt):
+        value = "None"
+        if stmt.initializer is not None:
+            value = self.expr(stmt.initializer)
+
+        self.declare(self.analyzer.bindings.get(stmt), stmt.name.lexeme, value)
+
+    def visit_while_stmt(self, stmt):
+        self.emit(f"while {self.condition(stmt.condition)}:")
+        self.emit_suite(stmt.body)
+
+    def visit_assign_expr(self, expr):
+        binding = self.analyzer.references[expr]
+        value = self.expr(expr.value)
+
+        if binding is None:
+            return f"_assign(_G, 'G_{expr.name.lexeme}', {value}, {expr.name.line})"
+
+        if binding.boxed:
+            return f"_store({binding.python_name}, {value})"
+
+        return f"({binding.python_name} := {value})"
+
+    def visit_binary_expr(self, expr):
+        # Python's parser limits how deeply parentheses nest, so a long chain
+        # like a + b + c is emitted as a tuple evaluating it a few operations
+        # at a time, each into a temporary, instead of all nested in each other
+        chain = [expr]
+        while type(chain[-1].left) is Binary:
+            chain.append(chain[-1].left)
+
+        value = self.expr(chain[-1].left)
+        steps = []
+
+        for depth, operation in enumerate(reversed(chain[1:]), 1):
+            value = self.operation(operation, value, self.expr(operation.right))
+
+            if depth % CHAIN_DEPTH == 0:
+                temp = self.temp()
+                steps.append(f"{temp} := {value}")
+                value = temp
+
+        code = self.operation(expr, value, self.expr(expr.right))
+
+        if not steps:
+            return code
+
+        return f"({', '.join(steps)}, {code})[-1]"
+
+    def operation(self, expr: Binary, left: str, right: str) -> str:
+        a, b = self.temp(), self.temp()
+        line = expr.operator.line
+        token_type = expr.operator.token_type
+
+        if token_type == TokenType.PLUS:
+            kind = self.temp()
+            return (f"({a} + {b} if ({kind} := type({a} := {left})) is type({b} := {right}) "
+                    f"and ({kind} is _F or {kind} is _S) else _plus({line}))")
+
+        if token_type == TokenType.EQUAL_EQUAL:
+            # Identity for bound methods, which Python compares by receiver and function
+            return f"({a} == {b} if ({a} := {left}) is ({b} := {right}) or type({a}) is not _M else False)"
+
+        if token_type == TokenType.BANG_EQUAL:
+            return f"({a} != {b} if ({a} := {left}) is ({b} := {right}) or type({a}) is not _M else True)"
+
+        operator = ARITHMETIC[token_type]
+        return f"({a} {operator} {b} if type({a} := {left}) is type({b} := {right}) is _F else _numbers({line}))"
+
+    def visit_call_expr(self, expr):
+        callee = self.temp()
+        count = len(expr.arguments)
+        line = expr.paren.line
+
+        arguments = [self.temp() for _ in expr.arguments]
+        evaluated = [f"({callee} := {self.expr(expr.callee)})"]
+        evaluated.extend(f"({temp} := {self.expr(argument)})" for temp, argument in zip(arguments, expr.arguments))
+
+        check = (f"type({callee}) is _FN and {callee}.__code__.co_argcount == {count} or "
+                 f"type({callee}) is _M and {callee}.__func__.__code__.co_argcount == {count + 1}")
+        # Calls are moved to their Lox line too, for a RecursionError raised there
+        call = f"{self.marker(CALL_MARKER, callee, line)}({', '.join(arguments)})"
+        fallback = f"{self.marker(CALL_MARKER, '_call', line)}({', '.join([callee, str(line)] + arguments)})"
+
+        # The callee and the arguments are evaluated in order before anything is checked
+        return f"({call} if ({', '.join(evaluated)},) and ({check}) else {fallback})"
+
+    def visit_get_expr(self, expr):
+        attribute = self.marker(PROPERTY_MARKER, property_name(expr.name.lexeme), expr.name.line)
+
+        if type(expr.object).__name__ == "This":
+            return f"this.{attribute}"
+
+        instance = self.temp()
+        return (f"({instance}.{attribute} if isinstance({instance} := {self.expr(expr.object)}, _Obj) "
+                f"else _no_properties({expr.name.line}))")
+
+    def visit_grouping_expr(self, expr):
+        return f"({self.expr(expr.expression)})"
+
+    def visit_literal_expr(self, expr):
+        return repr(expr.value)
+
+    def visit_logical_expr(self, expr):
+        # A chain like a or b or c is emitted as one flat conditional expression
+        # that stops at the first operand deciding it, rather than nested ones
+        token_type = expr.operator.token_type
+        chain = [expr]
+        while type(chain[-1].left) is Logical and chain[-1].left.operator.token_type == token_type:
+            chain.append(chain[-1].left)
+
+        operands = [chain[-1].left] + [logical.right for logical in reversed(chain)]
+        value = self.temp()
+
+        if token_type == TokenType.OR:
+            decides = f"is not None and {value} is not False"
+        else:
+            decides = f"is None or {value} is False"
+
+        branches = [f"{value} if ({value} := {self.expr(operand)}) {decides} else " for operand in operands[:-1]]
+        return f"({''.join(branches)}{self.expr(operands[-1])})"
+
+    def visit_set_expr(self, expr):
+        attribute = property_name(expr.name.lexeme)
+
+        if type(expr.object).__name__ == "This":
+            return f"_set(this, {attribute!r}, {self.expr(expr.value)})"
+
+        instance = self.temp()
+        checked = f"({instance} if isinstance({instance} := {self.expr(expr.object)}, _Obj) else _no_fields({expr.name.line}))"
+        return f"_set({checked}, {attribute!r}, {self.expr(expr.value)})"
+
+    def visit_super_expr(self, expr):
+        super_class = self.analyzer.references[expr].python_name
+        return f"_super({super_class}, {property_name(expr.method.lexeme)!r}, this, {expr.method.line})"
+
+    def visit_this_expr(self, expr):
+        return "this"
+
+    def visit_unary_expr(self, expr):
+        right = self.expr(expr.right)
+        value = self.temp()
+
+        if expr.operator.token_type == TokenType.BANG:
+            return f"(({value} := {right}) is None or {value} is False)"
+
+        return f"(-{value} if type({value} := {right}) is _F else _number({expr.operator.line}))"
+
+    def visit_variable_expr(self, expr):
+        binding = self.analyzer.references[expr]
+
+        if binding is None:
+            return self.marker(GLOBAL_MARKER, f"G_{expr.name.lexeme}", expr.name.line)
+
+        return self.load(binding)
+
+
+class MarkerTransformer(ast.NodeTransformer):
+    """
+    Replaces marker names with the real global, attribute and callee names
+    and moves them to the line of their Lox token, so a NameError,
+    AttributeError or RecursionError raised there points at the right Lox line.
+    """
+
+    def __init__(self, markers):
+        self.markers = markers
+
+    def relocate(self, node, line: int):
+        node.lineno = node.end_lineno = line
+
+    def visit_Name(self, node):
+        if node.id.startswith(GLOBAL_MARKER):
+            node.id, line = self.markers[int(node.id[len(GLOBAL_MARKER):])]
+            self.relocate(node, line)
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name) and node.func.id.startswith(CALL_MARKER):
+            node.func.id, line = self.markers[int(node.func.id[len(CALL_MARKER):])]
+            self.relocate(node.func, line)
+            self.relocate(node, line)
+        return node
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if node.attr.startswith(PROPERTY_MARKER):
+            node.attr, line = self.markers[int(node.attr[len(PROPERTY_MARKER):])]
+            self.relocate(node, line)
+        return node
+
+
+def error_line(exc: Exception) -> int:
+    line = 0
+    traceback = exc.__traceback__
+    while traceback:
+        if traceback.tb_frame.f_code.co_filename == Transpiler.FILENAME:
+            line = traceback.tb_lineno
+        traceback = traceback.tb_next
+    return line
+
+
+def execute(code: CodeType, namespace: dict):
+    """
+    Runs transpiled code, reporting Python's own lookup failures as Lox runtime errors
+    """
+    try:
+        exec(code, namespace)
+    except NameError as exc:
+        raise error(f"Undefined variable '{lox_name(exc.name)}'.", error_line(exc)) from None
+    except AttributeError as exc:
+        raise error(f"Undefined property {source_property_name(exc.name)}.", error_line(exc)) from None
+    except RecursionError as exc:
+        raise error("Stack overflow.", error_line(exc)) from None
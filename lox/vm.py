@@ -0,0 +1,508 @@
+import time
+
+from lox.compiler import OpCode, VMFunction
+from lox.exception import RuntimeException
+
+
+class Cell:
+    """
+    Box for a local variable captured by a closure
+    """
+    __slots__ = ("value", )
+
+    def __init__(self, value):
+        self.value = value
+
+
+class VMClosure:
+    __slots__ = ("function", "upvalues")
+
+    def __init__(self, function: VMFunction, upvalues: list):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self):
+        return str(self.function)
+
+
+class VMNative:
+    __slots__ = ("arity", "function")
+
+    def __init__(self, arity: int, function):
+        self.arity = arity
+        self.function = function
+
+    def __str__(self):
+        return "<native fn>"
+
+
+class VMClass:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str, methods: dict):
+        self.name = name
+        self.methods = methods
+
+    def __str__(self):
+        return self.name
+
+
+class VMInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: VMClass):
+        self.klass = klass
+        self.fields = {}
+
+    def __str__(self):
+        return self.klass.name + " instance"
+
+
+class VMBoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver, method: VMClosure):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self):
+        return str(self.method)
+
+
+class NoMethod:
+    """
+    Marker pushed by LOAD_METHOD below a callable that is not a method
+    """
+
+
+NO_METHOD = NoMethod()
+
+# Default limit on the number of nested Lox calls
+MAX_DEPTH = 100_000
+
+
+def stringify(value):
+    if value is None:
+        return "nil"
+
+    if type(value) is float:
+        text = str(value)
+
+        if text[-2:] == ".0":
+            text = text[:len(text) - 2]
+
+        return text
+
+    return str(value)
+
+
+class VM:
+    """
+    Stack based virtual machine executing code produced by lox.compiler.
+
+    Every frame's locals live on the shared value stack starting at the frame
+    base, so Lox calls push a frame record instead of recursing in Python and
+    their depth is only bounded by max_depth.
+    """
+
+    def __init__(self, error_handler, max_depth: int = MAX_DEPTH):
+        self.error_handler = error_handler
+        self.max_depth = max_depth
+        self.globals = {
+            "clock": VMNative(0, time.time),
+        }
+
+    def interpret(self, function: VMFunction):
+        try:
+            self.run(VMClosure(function, []))
+        except RuntimeException as exc:
+            self.error_handler(exc)
+
+    def runtime_error(self, tokens, ip: int, message: str):
+        return RuntimeException(tokens[ip - 1], message)
+
+    def run(self, script: VMClosure):
+        CONSTANT = OpCode.CONSTANT.value
+        POP = OpCode.POP.value
+        GET_LOCAL = OpCode.GET_LOCAL.value
+        SET_LOCAL = OpCode.SET_LOCAL.value
+        GET_CELL = OpCode.GET_CELL.value
+        SET_CELL = OpCode.SET_CELL.value
+        BOX = OpCode.BOX.value
+        GET_UPVALUE = OpCode.GET_UPVALUE.value
+        SET_UPVALUE = OpCode.SET_UPVALUE.value
+        GET_GLOBAL = OpCode.GET_GLOBAL.value
+        DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+        SET_GLOBAL = OpCode.SET_GLOBAL.value
+        GET_PROPERTY = OpCode.GET_PROPERTY.value
+        GET_LOCAL_PROPERTY = OpCode.GET_LOCAL_PROPERTY.value
+        SET_PROPERTY = OpCode.SET_PROPERTY.value
+        CHECK_INSTANCE = OpCode.CHECK_INSTANCE.value
+        GET_SUPER = OpCode.GET_SUPER.value
+        EQUAL = OpCode.EQUAL.value
+        NOT_EQUAL = OpCode.NOT_EQUAL.value
+        GREATER = OpCode.GREATER.value
+        GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+        LESS = OpCode.LESS.value
+        LESS_EQUAL = OpCode.LESS_EQUAL.value
+        ADD = OpCode.ADD.value
+        SUBTRACT = OpCode.SUBTRACT.value
+        MULTIPLY = OpCode.MULTIPLY.value
+        DIVIDE = OpCode.DIVIDE.value
+        NOT = OpCode.NOT.value
+        NEGATE = OpCode.NEGATE.value
+        PRINT = OpCode.PRINT.value
+        JUMP = OpCode.JUMP.value
+        JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+        JUMP_IF_FALSE_OR_POP = OpCode.JUMP_IF_FALSE_OR_POP.value
+        JUMP_IF_TRUE_OR_POP = OpCode.JUMP_IF_TRUE_OR_POP.value
+        CALL = OpCode.CALL.value
+        LOAD_METHOD = OpCode.LOAD_METHOD.value
+        LOAD_SUPER_METHOD = OpCode.LOAD_SUPER_METHOD.value
+        CALL_METHOD = OpCode.CALL_METHOD.value
+        CLOSURE = OpCode.CLOSURE.value
+        CHECK_SUPERCLASS = OpCode.CHECK_SUPERCLASS.value
+        CLASS = OpCode.CLASS.value
+        RETURN = OpCode.RETURN.value
+
+        globals = self.globals
+        error = self.runtime_error
+        max_depth = self.max_depth
+
+        stack = [script]
+        push = stack.append
+        pop = stack.pop
+        frames = []
+
+        closure = script
+        upvalues = closure.upvalues
+        code = script.function.code
+        tokens = script.function.tokens
+        ip = 0
+        base = 0
+        # Stack index the frame's result replaces once it returns
+        result_slot = 0
+
+        while True:
+            op, operand = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + operand])
+
+            elif op == CONSTANT:
+                push(operand)
+
+            elif op == GET_GLOBAL:
+                try:
+                    push(globals[operand])
+                except KeyError:
+                    raise error(tokens, ip, f"Undefined variable '{operand}'.")
+
+            elif op == POP:
+                pop()
+
+            elif op == RETURN:
+                value = pop()
+                if not frames:
+                    del stack[:]
+                    return
+
+                del stack[result_slot:]
+                push(value)
+                closure, code, tokens, ip, base, result_slot = frames.pop()
+                upvalues = closure.upvalues
+
+            elif op == GET_LOCAL_PROPERTY:
+                slot, name = operand
+                instance = stack[base + slot]
+                if type(instance) is not VMInstance:
+                    raise error(tokens, ip, "Only instances have properties.")
+
+                fields = instance.fields
+                if name in fields:
+                    push(fields[name])
+                else:
+                    method = instance.klass.methods.get(name)
+                    if method is None:
+                        raise error(tokens, ip, f"Undefined property {name}.")
+                    push(VMBoundMethod(instance, method))
+
+            elif op == GET_PROPERTY:
+                instance = stack[-1]
+                if type(instance) is not VMInstance:
+                    raise error(tokens, ip, "Only instances have properties.")
+
+                fields = instance.fields
+                if operand in fields:
+                    stack[-1] = fields[operand]
+                else:
+                    method = instance.klass.methods.get(operand)
+                    if method is None:
+                        raise error(tokens, ip, f"Undefined property {operand}.")
+                    stack[-1] = VMBoundMethod(instance, method)
+
+            elif op == CALL or op == CALL_METHOD:
+                callee_slot = len(stack) - operand - 1
+                if op == CALL:
+                    callee = stack[callee_slot]
+                    result_to = callee_slot
+                else:
+                    method = stack[callee_slot - 1]
+                    result_to = callee_slot - 1
+                    if method is NO_METHOD:
+                        callee = stack[callee_slot]
+                    else:
+                        # Receiver is already in slot zero of the new frame
+                        callee = method
+
+                # Closures are called the most, the other callables are checked after them
+                if type(callee) is not VMClosure:
+                    if type(callee) is VMBoundMethod:
+                        stack[callee_slot] = callee.receiver
+                        callee = callee.method
+                    elif type(callee) is VMClass:
+                        instance = VMInstance(callee)
+                        stack[callee_slot] = instance
+                        initializer = callee.methods.get("init")
+                        if initializer is None:
+                            if operand != 0:
+                                raise error(tokens, ip, f"Expected 0 arguments but got {operand}.")
+                            del stack[result_to:]
+                            push(instance)
+                            continue
+                        callee = initializer
+                    elif type(callee) is VMNative:
+                        if operand != callee.arity:
+                            raise error(tokens, ip, f"Expected {callee.arity} arguments but got {operand}.")
+                        value = callee.function(*stack[callee_slot + 1:])
+                        del stack[result_to:]
+                        push(value)
+                        continue
+                    else:
+                        raise error(tokens, ip, "Can only call functions and classes.")
+
+                function = callee.function
+                if operand != function.arity:
+                    raise error(tokens, ip, f"Expected {function.arity} arguments but got {operand}.")
+
+                if len(frames) == max_depth:
+                    raise error(tokens, ip, "Stack overflow.")
+
+                frames.append((closure, code, tokens, ip, base, result_slot))
+                closure = callee
+                upvalues = callee.upvalues
+                code = function.code
+                tokens = function.tokens
+                ip = 0
+                base = callee_slot
+                result_slot = result_to
+
+                for slot in function.cells:
+                    stack[base + slot] = Cell(stack[base + slot])
+
+            elif op == ADD:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left + right
+                elif type(left) is str and type(right) is str:
+                    stack[-1] = left + right
+                else:
+                    raise error(tokens, ip, "Operands must be two numbers or two strings")
+
+            elif op == JUMP_IF_FALSE:
+                value = pop()
+                if value is None or value is False:
+                    ip = operand
+
+            elif op == EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+
+            elif op == LOAD_METHOD:
+                instance = stack[-1]
+                if type(instance) is not VMInstance:
+                    raise error(tokens, ip, "Only instances have properties.")
+
+                fields = instance.fields
+                if operand in fields:
+                    stack[-1] = NO_METHOD
+                    push(fields[operand])
+                else:
+                    method = instance.klass.methods.get(operand)
+                    if method is None:
+                        raise error(tokens, ip, f"Undefined property {operand}.")
+                    stack[-1] = method
+                    push(instance)
+
+            elif op == LESS:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left < right
+
+            elif op == SET_GLOBAL:
+                if operand not in globals:
+                    raise error(tokens, ip, f"Undefined variable '{operand}'.")
+                globals[operand] = stack[-1]
+
+            elif op == CHECK_INSTANCE:
+                if type(stack[-1]) is not VMInstance:
+                    raise error(tokens, ip, "Only instances have fields.")
+
+            elif op == SET_PROPERTY:
+                value = pop()
+                stack[-1].fields[operand] = value
+                stack[-1] = value
+
+            elif op == SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left - right
+
+            elif op == JUMP:
+                ip = operand
+
+            elif op == SET_LOCAL:
+                stack[base + operand] = stack[-1]
+
+            elif op == GET_CELL:
+                push(stack[base + operand].value)
+
+            elif op == GET_UPVALUE:
+                push(upvalues[operand].value)
+
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+
+            elif op == GREATER:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left > right
+
+            elif op == GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left >= right
+
+            elif op == LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left <= right
+
+            elif op == NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+
+            elif op == MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left * right
+
+            elif op == DIVIDE:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise error(tokens, ip, "Operands must be numbers")
+                stack[-1] = left / right
+
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise error(tokens, ip, "Operand must be a number")
+                stack[-1] = -value
+
+            elif op == JUMP_IF_FALSE_OR_POP:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = operand
+                else:
+                    pop()
+
+            elif op == JUMP_IF_TRUE_OR_POP:
+                value = stack[-1]
+                if value is None or value is False:
+                    pop()
+                else:
+                    ip = operand
+
+            elif op == SET_CELL:
+                stack[base + operand].value = stack[-1]
+
+            elif op == SET_UPVALUE:
+                upvalues[operand].value = stack[-1]
+
+            elif op == DEFINE_GLOBAL:
+                globals[operand] = pop()
+
+            elif op == PRINT:
+                print(stringify(pop()))
+
+            elif op == BOX:
+                stack[base + operand] = Cell(stack[base + operand])
+
+            elif op == CLOSURE:
+                function, captures, boxed = operand
+                captured = []
+                new_closure = VMClosure(function, captured)
+                cell = Cell(new_closure) if boxed else None
+
+                for is_local, index in captures:
+                    if not is_local:
+                        captured.append(upvalues[index])
+                    elif base + index == len(stack):
+                        # The function captures the local it is being stored in
+                        captured.append(cell)
+                    else:
+                        captured.append(stack[base + index])
+
+                push(cell if boxed else new_closure)
+
+            elif op == GET_SUPER:
+                super_class = pop()
+                method = super_class.methods.get(operand)
+                if method is None:
+                    raise error(tokens, ip, f"Undefined property {operand}.")
+                stack[-1] = VMBoundMethod(stack[-1], method)
+
+            elif op == LOAD_SUPER_METHOD:
+                super_class = pop()
+                method = super_class.methods.get(operand)
+                if method is None:
+                    raise error(tokens, ip, f"Undefined property {operand}.")
+                # The receiver stays on top as slot zero of the method's frame
+                push(stack[-1])
+                stack[-2] = method
+
+            elif op == CHECK_SUPERCLASS:
+                if type(stack[-1]) is not VMClass:
+                    raise error(tokens, ip, "Superclass must be a class.")
+
+            elif op == CLASS:
+                name, method_names, has_super = operand
+                count = len(method_names)
+                closures = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+
+                methods = {}
+                if has_super:
+                    # Inherited methods are copied down, the class hierarchy is immutable
+                    methods.update(pop().methods)
+                methods.update(zip(method_names, closures))
+                push(VMClass(name, methods))
+
+            else:
+                raise RuntimeError(f"Unknown opcode {op}")
@@ -0,0 +1,61 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+PROGRAMS = Path(__file__).parent / "programs"
+
+EXPECT = re.compile(r"// expect: ?(.*)")
+EXPECT_RUNTIME_ERROR = re.compile(r"// expect runtime error: (.+)")
+EXPECT_ERROR = re.compile(r"// expect error: (.+)")
+
+
+def expected_run(path: Path):
+    """
+    Output and exit code a program declares in its '// expect' comments, an
+    error ends the program wherever its comment is
+    """
+    output = []
+    error = []
+    status = 0
+
+    for line, text in enumerate(path.read_text().splitlines(), 1):
+        if match := EXPECT.search(text):
+            output.append(match.group(1))
+        elif match := EXPECT_RUNTIME_ERROR.search(text):
+            error = [match.group(1), f"[line {line}]"]
+            status = 70
+        elif match := EXPECT_ERROR.search(text):
+            error = [match.group(1)]
+            status = 65
+
+    return "".join(f"{line}\n" for line in output + error), status
+
+
+@pytest.fixture
+def lox(tmp_path):
+    """
+    Runs python -m lox in a temporary directory, where scripts and their caches are kept
+    """
+    def run(*args, input=None) -> subprocess.CompletedProcess:
+        environment = dict(os.environ, PYTHONPATH=str(ROOT))
+        return subprocess.run([sys.executable, "-m", "lox", *args], cwd=tmp_path, env=environment,
+                              input=input, capture_output=True, text=True, timeout=120)
+
+    return run
+
+
+@pytest.fixture
+def program(tmp_path):
+    """
+    Copies a program of the corpus to the temporary directory
+    """
+    def copy(name: str) -> Path:
+        return Path(shutil.copy(PROGRAMS / name, tmp_path))
+
+    return copy
@@ -0,0 +1,79 @@
+import pytest
+
+from lox.lox import ENGINES, CHUNK_SIZE, Lox
+from lox.cache import cache_path
+from conftest import expected_run
+
+
+class RecordedFile:
+    """
+    File whose reads are recorded in reads
+    """
+
+    def __init__(self, file, reads: list):
+        self.file = file
+        self.reads = reads
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return self.file.read(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """
+    Sizes of the reads lox.lox makes from the files it opens
+    """
+    reads = []
+    monkeypatch.setattr("lox.lox.open", lambda *args, **kwargs: RecordedFile(open(*args, **kwargs), reads),
+                        raising=False)
+
+    for name in ("had_error", "had_runtime_error", "interpreter"):
+        monkeypatch.setattr(Lox, name, getattr(Lox, name))
+
+    return reads
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cached_program(lox, program, engine):
+    path = program("classes.lox")
+    output, status = expected_run(path)
+
+    first = lox(f"--engine={engine}", path.name)
+    kind = "code" if engine == "python" else f"{engine}.ast"
+    assert cache_path(path, kind).exists()
+
+    second = lox(f"--engine={engine}", path.name)
+
+    assert (first.stdout, first.returncode) == (output, status)
+    assert (second.stdout, second.stderr, second.returncode) == (output, "", status)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_changed_program_is_not_loaded_from_cache(lox, tmp_path, engine):
+    path = tmp_path / "changed.lox"
+
+    path.write_text('print "old";\n')
+    assert lox(f"--engine={engine}", path.name).stdout == "old\n"
+
+    path.write_text('print "new";\n')
+    assert lox(f"--engine={engine}", path.name).stdout == "new\n"
+
+
+def test_run_file_reads_the_script_in_chunks(reads, tmp_path, capsys):
+    path = tmp_path / "long.lox"
+    path.write_text('print "line";\n' * 20000)
+
+    Lox.run_file(str(path))
+
+    assert capsys.readouterr().out == "line\n" * 20000
+    assert cache_path(path, "interpreter.ast").exists()
+    # Once to look the cache up, and once while parsing
+    assert reads.count(CHUNK_SIZE) > 2 * path.stat().st_size // CHUNK_SIZE
+    assert set(reads) == {CHUNK_SIZE}
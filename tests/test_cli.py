@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from conftest import expected_run
+
+LOOP = """var total = 0;
+for (var i = 0; i < 10; i = i + 1)
+  total = total + i;
+print total;
+"""
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure", "vm"])
+def test_profile_runs_the_script(lox, program, tmp_path, engine):
+    path = program("functions.lox")
+    source = path.read_text()
+    output, status = expected_run(path)
+
+    # The script right after the flag, which is never taken as its value
+    result = lox(f"--engine={engine}", "--profile", path.name)
+
+    assert (result.stdout, result.returncode) == (output, status)
+    assert "samples" in result.stderr
+    assert path.read_text() == source
+    assert (tmp_path / "profile.folded").exists()
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure", "vm"])
+def test_profile_names_lox_functions(lox, tmp_path, engine):
+    path = tmp_path / "fib.lox"
+    path.write_text("fun fib(n) { if (n < 2) return n; return fib(n - 2) + fib(n - 1); }\nprint fib(22);\n")
+
+    result = lox(f"--engine={engine}", "--profile", path.name)
+
+    assert (result.stdout, result.returncode) == ("17711\n", 0)
+    assert "<script>;fib;fib" in (tmp_path / "profile.folded").read_text()
+
+
+def test_profile_output(lox, program, tmp_path):
+    path = program("functions.lox")
+
+    result = lox("--profile", "--profile-output", "fib.folded", path.name)
+
+    assert result.returncode == 0
+    assert (tmp_path / "fib.folded").exists()
+    assert not (tmp_path / "profile.folded").exists()
+
+
+def test_profile_rejects_python_engine(lox, program):
+    result = lox("--profile", "--engine=python", program("functions.lox").name)
+
+    assert result.returncode == 64
+
+
+@pytest.mark.parametrize("optimization", [[], ["-O"], ["-OO"]], ids=["O0", "O1", "O2"])
+def test_count_runs_the_script(lox, tmp_path, optimization):
+    path = tmp_path / "loop.lox"
+    path.write_text(LOOP)
+
+    result = lox(*optimization, "--count", "--count-output", "counts.json", path.name)
+
+    assert (result.stdout, result.returncode) == ("45\n", 0)
+    assert path.read_text() == LOOP
+
+    counts = json.loads((tmp_path / "counts.json").read_text())
+    assert {"node": "Assign", "line": 3, "count": 10} in counts["nodes"]
+    assert {"node": "Binary", "line": 2, "count": 11} in counts["nodes"]
+
+
+def test_count_reports_calls(lox, program):
+    path = program("functions.lox")
+    output, status = expected_run(path)
+
+    result = lox("--count", path.name)
+
+    assert (result.stdout, result.returncode) == (output, status)
+    assert "calls" in result.stderr
+    # fib(15) makes 1973 calls
+    assert "1973" in result.stderr
+
+
+def test_count_rejects_other_engines(lox, program):
+    result = lox("--count", "--engine=vm", program("functions.lox").name)
+
+    assert result.returncode == 64
+
+
+def test_usage_error(lox):
+    result = lox("one.lox", "two.lox")
+
+    assert result.returncode == 64
+    assert "Usage" in result.stdout + result.stderr
+
+
+def test_prompt(lox):
+    result = lox(input='print 1 + 2;\nvar a = "a";\nprint a + "b";\n')
+
+    assert "3\n" in result.stdout
+    assert "ab\n" in result.stdout
@@ -0,0 +1,31 @@
+import pytest
+
+from lox.lox import ENGINES
+from conftest import PROGRAMS, expected_run
+
+OPTIMIZATIONS = ([], ["-O"], ["-OO"])
+
+NAMES = sorted(path.name for path in PROGRAMS.glob("*.lox"))
+
+
+@pytest.mark.parametrize("optimization", OPTIMIZATIONS, ids=["O0", "O1", "O2"])
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", NAMES)
+def test_program(lox, program, name, engine, optimization):
+    path = program(name)
+    output, status = expected_run(path)
+
+    result = lox(*optimization, f"--engine={engine}", path.name)
+
+    assert (result.stdout, result.stderr, result.returncode) == (output, "", status)
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+def test_tail_calls_run_in_constant_depth(lox, tmp_path, engine):
+    path = tmp_path / "tail.lox"
+    path.write_text("fun sum(n, acc) { if (n == 0) return acc; return sum(n - 1, acc + n); }\n"
+                    "print sum(100000, 0);\n")
+
+    result = lox(f"--engine={engine}", path.name)
+
+    assert (result.stdout, result.returncode) == ("5000050000\n", 0)
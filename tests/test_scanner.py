@@ -0,0 +1,46 @@
+import pytest
+
+from lox.scanner import Scanner, FastScanner
+from conftest import ROOT, PROGRAMS
+
+SOURCES = [
+    "",
+    "// only a comment",
+    'print "unterminated',
+    "a @ b # c",
+    "print 1.; 1.5.x; 12.",
+    '"multi\nline" after',
+    "or and_ _x1 classy class this",
+    "!= == <= >= < > ! = / * - + ; , . ( ) { }",
+    "1\n\n\n2 // trailing\n3",
+]
+
+FILES = sorted(PROGRAMS.glob("*.lox")) + sorted((ROOT / "benchmarks").glob("*.lox"))
+
+
+def scan(scanner_class, source: str):
+    errors = []
+    tokens = scanner_class(source, lambda line, message: errors.append((line, message))).scan_tokens()
+    return [(token.token_type, token.lexeme, token.literal, token.line) for token in tokens], errors
+
+
+def sources():
+    yield from SOURCES
+    for path in FILES:
+        yield path.read_text()
+
+
+@pytest.mark.parametrize("source", list(sources()), ids=SOURCES + [path.name for path in FILES])
+def test_fast_scanner_matches_scanner(source):
+    assert scan(FastScanner, source) == scan(Scanner, source)
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1 << 16])
+@pytest.mark.parametrize("source", list(sources()), ids=SOURCES + [path.name for path in FILES])
+def test_chunked_tokens_match_whole_source(source, size):
+    errors = []
+    scanner = FastScanner("", lambda line, message: errors.append((line, message)))
+    chunks = [source[start:start + size] for start in range(0, len(source), size)]
+    tokens = [(token.token_type, token.lexeme, token.literal, token.line) for token in scanner.iter_tokens(chunks)]
+
+    assert (tokens, errors) == scan(FastScanner, source)
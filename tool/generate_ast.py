@@ -22,10 +22,16 @@ STATEMENTS_IMPORTS = COMMON_IMPORTS + (
 )
 
 
-def define_type(file, base_name, class_name, fields):
+def define_type(file, base_name, class_name, fields, resolved_fields):
     file.write(f"class {class_name}({base_name.title()}):")
     file.write('\n')
 
+    slots = ", ".join(f'"{field.split(":")[0]}"' for field in fields + resolved_fields)
+    if len(fields + resolved_fields) == 1:
+        slots += ", "
+    file.write(f"{INDENTATION}__slots__ = ({slots})")
+    file.write('\n\n')
+
     file.write(f"{INDENTATION}def __init__(self, {', '.join(fields)}):")
     file.write('\n')
 
@@ -34,6 +40,15 @@ def define_type(file, base_name, class_name, fields):
         file.write(f"{INDENTATION * 2}self.{attr} = {attr}")
         file.write('\n')
 
+    if resolved_fields:
+        file.write(f"{INDENTATION * 2}# Filled in by the resolver")
+        file.write('\n')
+
+    for field in resolved_fields:
+        attr = field.split(':')[0]
+        file.write(f"{INDENTATION * 2}self.{attr} = None")
+        file.write('\n')
+
     file.write('\n')
     file.write(f"{INDENTATION}def accept(self, visitor: {base_name.title()}Visitor):")
     file.write('\n')
@@ -58,7 +73,7 @@ def define_imports(file, imports):
     file.write('\n'.join(imports))
 
 
-def define_ast(output_dir: str, base_name: str, expr_types: dict, imports: Tuple[str, ...]):
+def define_ast(output_dir: str, base_name: str, expr_types: dict, imports: Tuple[str, ...], resolved_types: dict):
     path = os.path.join(output_dir, f"{base_name}.py")
 
     with open(path, mode='w') as file:
@@ -68,6 +83,8 @@ def define_ast(output_dir: str, base_name: str, expr_types: dict, imports: Tuple
         file.write('\n\n')
         file.write(f"class {base_name.title()}(ABC):")
         file.write('\n')
+        file.write(f"{INDENTATION}__slots__ = ()")
+        file.write('\n\n')
         file.write(f"{INDENTATION}@abstractmethod")
         file.write('\n')
         file.write(f"{INDENTATION}def accept(self, visitor: {base_name.title()}Visitor):")
@@ -78,7 +95,7 @@ def define_ast(output_dir: str, base_name: str, expr_types: dict, imports: Tuple
         for type in expr_types:
             class_name = type
             fields = expr_types[type]
-            define_type(file, base_name, class_name, fields)
+            define_type(file, base_name, class_name, fields, resolved_types.get(type, ()))
 
 
 def main(args):
@@ -101,7 +118,18 @@ def main(args):
         "Unary"    : ("operator: Token", "right: Expr"),
         "Variable" : ("name: Token", )
     },
-    EXPRESSION_IMPORTS)
+    EXPRESSION_IMPORTS,
+    {
+        "Assign"   : ("depth: int", "slot: int"),
+        "Binary"   : ("operation: Callable", ),
+        "Call"     : ("tail: bool", ),
+        "Get"      : ("cache: InlineCache", ),
+        "Set"      : ("cache: InlineCache", ),
+        "Super"    : ("depth: int", "slot: int"),
+        "This"     : ("depth: int", "slot: int"),
+        "Unary"    : ("operation: Callable", ),
+        "Variable" : ("depth: int", "slot: int")
+    })
 
     define_ast(output_dir, "stmt", {
         "Block"      : ("statements: List[Stmt]", ),
@@ -114,7 +142,14 @@ def main(args):
         "Var"        : ("name: Token", "initializer: Expr"),
         "While"      : ("condition: Expr", "body: Stmt")
     },
-    STATEMENTS_IMPORTS)
+    STATEMENTS_IMPORTS,
+    {
+        "Block"    : ("size: int", ),
+        "Class"    : ("depth: int", "slot: int"),
+        "Function" : ("depth: int", "slot: int", "size: int"),
+        "Var"      : ("depth: int", "slot: int"),
+        "While"    : ("reuse_scope: bool", )
+    })
 
 
 if __name__ == "__main__":